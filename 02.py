@@ -1,55 +1,20 @@
 #!/usr/bin/env python
 
-from copy import copy
-from itertools import product
-
-class IntcodeProgram:
-    def __init__(self, memory):
-        self.m = copy(memory)
-        # current location of instruction pointer
-        self.ip = 0
-
-    def update(self, addr, new_val):
-        self.m[addr] = new_val
-
-    def get(self, addr):
-        return self.m[addr]
-
-    def addr(self):
-        if len(self.m) < self.ip + 3:
-            raise IndexError('not enough parameters to complete instruction addr')
-        a = self.m[self.ip + 1]
-        b = self.m[self.ip + 2]
-        c = self.m[self.ip + 3]
-
-        self.m[c] = self.m[a] + self.m[b]
-        self.ip += 4
-
-    def multr(self):
-        if len(self.m) < self.ip + 3:
-            raise IndexError('not enough parameters to complete instruction multr')
-        a = self.m[self.ip + 1]
-        b = self.m[self.ip + 2]
-        c = self.m[self.ip + 3]
-
-        self.m[c] = self.m[a] * self.m[b]
-        self.ip += 4
-
-    def run(self):
-        while (self.ip < len(self.m)) and (self.m[self.ip] != 99):
-            opcode = self.m[self.ip]
-            if opcode == 1:
-                self.addr()
-            elif opcode == 2:
-                self.multr()
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
+from intcode import IntcodeProgram, WatchdogError
+from intcode_image import load_program
+from intcode_pool import worker_pool, worker_state
+
+TARGET = 19690720
+# nouns each worker of the sweep tries in one task
+CHUNK_SIZE = 4
+# instructions a single noun and verb may run for, an overwritten opcode can
+# send the program into a loop
+MAX_STEPS = 100_000
 
 
 def main():
-    with open('02.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().split(',')]
-        program = IntcodeProgram(memory)
+    memory = load_program('02.txt')
+    program = IntcodeProgram(memory)
 
     print(f'part1: {part1(program)}')
 
@@ -65,19 +30,104 @@ def part1(program):
 
     return program.get(0)
 
-def part2(memory):
-    # noun, verb: [0, 99]
-    for noun, verb in product(range(100), range(100)):
-        program = IntcodeProgram(memory)
-        program.update(1, noun)
-        program.update(2, verb)
-
+def run_with(program, snapshot, noun, verb):
+    """Output of the program restored to snapshot for noun and verb, None if it fails."""
+    program.restore(snapshot)
+    program.update(1, noun)
+    program.update(2, verb)
+    try:
         program.run()
-        output = program.get(0)
+    except (ValueError, IndexError, MemoryError, WatchdogError):
+        # noun or verb pointing the program at nonsense
+        return None
+    return program.get(0)
 
-        if output == 19690720:
-            return 100 * noun + verb
-    return 0
+def affine_fit(memory, nouns, verbs):
+    """Coefficients (a, b, c) with output = a * noun + b * verb + c, or None if the probes disagree.
+
+    Three runs give the coefficients and a few more check them. That is no
+    proof, so a solution of the fit is still run once before it is trusted.
+    """
+    program = IntcodeProgram(memory, max_steps=MAX_STEPS)
+    snapshot = program.snapshot()
+    n0, v0 = nouns[0], verbs[0]
+    outputs = [run_with(program, snapshot, n0 + dn, v0 + dv) for dn, dv in ((0, 0), (1, 0), (0, 1))]
+    if None in outputs:
+        return None
+    c, a, b = outputs[0], outputs[1] - outputs[0], outputs[2] - outputs[0]
+
+    probes = {
+        (nouns[-1], verbs[-1]),
+        (nouns[len(nouns) // 2], verbs[len(verbs) // 3]),
+        (nouns[len(nouns) // 3], verbs[-1]),
+    }
+    for noun, verb in probes:
+        if run_with(program, snapshot, noun, verb) != a * (noun - n0) + b * (verb - v0) + c:
+            return None
+    return a, b, c - a * n0 - b * v0
+
+def solve_affine(a, b, c, target, nouns, verbs):
+    """First (noun, verb) in sweep order with a * noun + b * verb + c == target."""
+    rest = target - c
+    if b:
+        for noun in nouns:
+            verb, remainder = divmod(rest - a * noun, b)
+            if not remainder and verb in verbs:
+                return noun, verb
+    elif a:
+        noun, remainder = divmod(rest, a)
+        if not remainder and noun in nouns:
+            return noun, verbs[0]
+    elif rest == 0:
+        return nouns[0], verbs[0]
+    return None
+
+def sweep_chunk(nouns):
+    memory, verbs, target = worker_state()
+    program = IntcodeProgram(memory, max_steps=MAX_STEPS)
+    snapshot = program.snapshot()
+    for noun in nouns:
+        for verb in verbs:
+            if run_with(program, snapshot, noun, verb) == target:
+                return noun, verb
+    return None
+
+def sweep(memory, target, nouns, verbs, processes=None):
+    """First (noun, verb) in order giving target, trying chunks of nouns across a process pool."""
+    chunks = [nouns[start:start + CHUNK_SIZE] for start in range(0, len(nouns), CHUNK_SIZE)]
+    with worker_pool((list(memory), verbs, target), processes) as pool:
+        # imap keeps the chunks in order, so the first match is the one a
+        # serial sweep would find
+        for found in pool.imap(sweep_chunk, chunks):
+            if found is not None:
+                return found
+    return None
+
+def find_inputs(memory, target=TARGET, nouns=range(100), verbs=range(100)):
+    """First (noun, verb) in product order of nouns and verbs making the program output target.
+
+    Programs whose output is affine in noun and verb are solved directly,
+    the rest are swept. With an affine fit and no solution for it, the
+    target is taken as out of reach without a sweep.
+    """
+    if not nouns or not verbs:
+        return None
+    fit = affine_fit(memory, nouns, verbs)
+    if fit is not None:
+        found = solve_affine(*fit, target, nouns, verbs)
+        if found is None:
+            return None
+        program = IntcodeProgram(memory, max_steps=MAX_STEPS)
+        if run_with(program, program.snapshot(), *found) == target:
+            return found
+    return sweep(memory, target, nouns, verbs)
+
+def part2(memory, target=TARGET, nouns=range(100), verbs=range(100)):
+    found = find_inputs(memory, target, nouns, verbs)
+    if found is None:
+        return 0
+    noun, verb = found
+    return 100 * noun + verb
 
 
 if __name__ == '__main__':
@@ -1,183 +1,61 @@
 #!/usr/bin/env python
 
-from copy import copy
-from enum import Enum
+from functools import partial
 from itertools import permutations
 
+from intcode import IntcodeProgram
+from intcode_image import load_program
+from intcode_network import ProgramGraph
+from intcode_pool import worker_pool, worker_state
 
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    HALT = 99
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory)
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
 
 def main():
-    with open('07.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('07.txt')
 
     print(f'part1: {part1(memory)}')
     print(f'part2: {part2(memory)}')
 
 def part1(memory):
-    max_signal = 0
-    for phase_settings in permutations(range(5)):
-        outputs = [0]
-        for phase_setting in phase_settings:
-            amp = IntcodeProgram(memory, [phase_setting] + outputs)
-            outputs, _ = amp.run()
-        max_signal = max(max_signal, outputs[-1])
+    max_signal, _ = search_phase_settings(memory, range(5))
     return max_signal
 
 def part2(memory):
-    max_signal = 0
-    for phase_settings in permutations(range(5, 10)):
-
-        machines = []
-        # set up machines with each phase setting
-        for phase_setting in phase_settings:
-            machine = IntcodeProgram(memory, [phase_setting])
-            outputs, complete = machine.run()
-            if len(outputs) != 0:
-                raise Exception('output should be zero')
-            if complete:
-                raise Exception('machine should not be done executing program')
-            machines.append(machine)
-
-        idx = 0
-        outputs = [0]
-        while True:
-            machine = machines[idx]
-            machine.add_inputs(outputs)
-            outputs, complete = machine.run()
-            if complete:
-                del machines[idx]
-                if len(machines) == 0:
-                    break
-                idx = idx % len(machines)
-            else:
-                idx = (idx + 1) % len(machines)
-
-        max_signal = max(max_signal, outputs[-1])
-
+    max_signal, _ = search_phase_settings(memory, range(5, 10), feedback=True)
     return max_signal
 
+def amplify(memory, phase_settings, feedback=False):
+    """Signal sent to the thrusters by a chain of amplifiers, or a feedback loop."""
+    amps = ProgramGraph()
+    for idx, phase_setting in enumerate(phase_settings):
+        amps.add(idx, IntcodeProgram(memory, [phase_setting]))
+    for idx in range(len(phase_settings) - 1):
+        amps.connect(idx, idx + 1)
+
+    last = len(phase_settings) - 1
+    if feedback:
+        amps.connect(last, 0)
+    thrusters = amps.tap(last)
+
+    amps.send(0, [0])
+    amps.run()
+    return thrusters[-1]
+
+def evaluate(feedback, phase_settings):
+    memory, = worker_state()
+    return amplify(memory, phase_settings, feedback), phase_settings
+
+def search_phase_settings(memory, phases, length=None, feedback=False, processes=None):
+    """Find the phase settings giving the highest signal, spread over a process pool.
+
+    Tries every ordering of length distinct phases (all of them by default) and
+    returns the highest signal along with its phase settings.
+    """
+    candidates = permutations(phases, length)
+    chunksize = 8
+
+    with worker_pool((list(memory),), processes) as pool:
+        results = pool.imap_unordered(partial(evaluate, feedback), candidates, chunksize)
+        return max(results)
+
 if __name__ == '__main__':
     main()
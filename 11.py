@@ -1,187 +1,122 @@
 #!/usr/bin/env python
 
-from copy import copy
-from enum import Enum
-from collections import defaultdict
-
-
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 1_000_000
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
+from intcode import IntcodeProgram
+from intcode_image import load_program
+
+# up, left, down, right, turning left adds one and turning right subtracts one
+DIRECTIONS = [(0, 1), (-1, 0), (0, -1), (1, 0)]
+UP = 0
+TURNS = {0: 1, 1: -1}
+
+
+class Canvas:
+    """Hull panels packed as bits, one plane for the colors and one for the panels ever painted.
+
+    The canvas starts small around the origin and doubles towards any panel
+    painted outside it. Its width stays a multiple of 8, so every row is whole
+    bytes and growing copies rows as byte slices.
+    """
+    def __init__(self, width=64, height=64):
+        self.x0 = -(width // 2)
+        self.y0 = -(height // 2)
+        self.width = width
+        self.height = height
+        self.colors = bytearray(width * height // 8)
+        self.painted = bytearray(width * height // 8)
+
+    def _index(self, x, y):
+        col = x - self.x0
+        row = y - self.y0
+        if 0 <= col < self.width and 0 <= row < self.height:
+            return row * self.width + col
+        return None
+
+    def get(self, x, y):
+        idx = self._index(x, y)
+        if idx is None:
+            return 0
+        return self.colors[idx >> 3] >> (idx & 7) & 1
+
+    def paint(self, x, y, color):
+        idx = self._index(x, y)
+        if idx is None:
+            self._grow(x, y)
+            idx = self._index(x, y)
+        byte = idx >> 3
+        mask = 1 << (idx & 7)
+        self.painted[byte] |= mask
+        if color:
+            self.colors[byte] |= mask
         else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
-
-
-def paint(position, direction, painting, program):
-    while True:
-        program.add_inputs([painting[position]])
-
-        output, complete = program.run()
-        color, turn = output[0], output[1]
-
-        # save color output
-        painting[position] = color
-        # get new direction
+            self.colors[byte] &= ~mask
+
+    def _grow(self, x, y):
+        x0, y0, width, height = self.x0, self.y0, self.width, self.height
+        while x < x0:
+            x0 -= width
+            width *= 2
+        while x >= x0 + width:
+            width *= 2
+        while y < y0:
+            y0 -= height
+            height *= 2
+        while y >= y0 + height:
+            height *= 2
+
+        row_bytes = self.width // 8
+        new_row_bytes = width // 8
+        offset = (self.y0 - y0) * new_row_bytes + (self.x0 - x0) // 8
+        for name in ('colors', 'painted'):
+            old = getattr(self, name)
+            new = bytearray(width * height // 8)
+            for row in range(self.height):
+                start = offset + row * new_row_bytes
+                new[start:start + row_bytes] = old[row * row_bytes:(row + 1) * row_bytes]
+            setattr(self, name, new)
+        self.x0, self.y0, self.width, self.height = x0, y0, width, height
+
+    def count(self):
+        """Number of panels painted at least once."""
+        return int.from_bytes(self.painted, 'little').bit_count()
+
+    def panels(self):
+        """Positions of the panels painted at least once."""
+        for byte, bits in enumerate(self.painted):
+            while bits:
+                bit = bits & -bits
+                idx = byte * 8 + bit.bit_length() - 1
+                yield self.x0 + idx % self.width, self.y0 + idx // self.width
+                bits ^= bit
+
+
+def paint(program, canvas, position=(0, 0), direction=UP):
+    """Drive the robot until its program halts, returns the number of steps it took."""
+    x, y = position
+    steps = 0
+    robot = program.stream(group=2)
+    for output in robot:
+        if output is None:
+            # robot is waiting for the color of its panel
+            program.add_inputs([canvas.get(x, y)])
+            continue
+        color, turn = output
+
+        canvas.paint(x, y, color)
         direction = turn_robot(direction, turn)
-        # move robot
-        position = (
-            position[0] + direction[0],
-            position[1] + direction[1]
-        )
-
-        if complete:
-            break
-
-    return painting
-
-def turn_robot(old_direction: tuple, turn: int):
-    # up, left, bottom, right
-    directions = [(0, 1), (-1, 0), (0, -1), (1, 0)]
-    idx = directions.index(old_direction)
-
-    # turn left 90 degrees (idx + 1)
-    if turn == 0:
-        return directions[(idx + 1) % len(directions)]
-    # turn right 90 degrees (idx - 1)
-    elif turn == 1:
-        return directions[(idx - 1) % len(directions)]
-    else:
+        dx, dy = DIRECTIONS[direction]
+        x += dx
+        y += dy
+        steps += 1
+
+    return steps
+
+def turn_robot(direction: int, turn: int):
+    if turn not in TURNS:
         raise Exception(f'cannot turn robot with turn output {turn}')
-    return
+    return (direction + TURNS[turn]) % len(DIRECTIONS)
 
-def print_painting(painting):
-    points = painting.keys()
+def print_painting(canvas):
+    points = list(canvas.panels())
 
     min_x = min([point[0] for point in points])
     max_x = max([point[0] for point in points])
@@ -191,41 +126,34 @@ def print_painting(painting):
 
     for y in range(max_y, min_y - 1, -1):
         for x in range(min_x, max_x + 1):
-            print('██' if painting[(x, y)] else '  ', end = '')
+            print('██' if canvas.get(x, y) else '  ', end = '')
         print()
 
 
 def main():
-    with open('11.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('11.txt')
 
     print(f'part1: {part1(memory)}')
     print(f'part2:')
     part2(memory)
 
 def part1(memory):
-    robot_position = (0, 0)
-    robot_direction = (0, 1)
-    painting = defaultdict(int)
-
+    canvas = Canvas()
     program = IntcodeProgram(memory, [])
 
-    painting = paint(robot_position, robot_direction, painting, program)
+    paint(program, canvas)
 
-    return len(painting.keys())
+    return canvas.count()
 
 def part2(memory):
-    robot_position = (0, 0)
-    robot_direction = (0, 1)
-    painting = defaultdict(int)
-
+    canvas = Canvas()
     program = IntcodeProgram(memory, [])
 
     # start on a white panel
-    painting[robot_position] = 1
-    painting = paint(robot_position, robot_direction, painting, program)
+    canvas.paint(0, 0, 1)
+    paint(program, canvas)
 
-    print_painting(painting)
+    print_painting(canvas)
 
 
 if __name__ == '__main__':
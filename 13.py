@@ -1,168 +1,121 @@
 #!/usr/bin/env python
 
-from copy import copy
-from enum import Enum
-from collections import Counter
-
-
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 1_000_000
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
+import time
+
+from intcode import IntcodeProgram
+from intcode_image import load_program
+
+# tile ids the game draws
+EMPTY, WALL, BLOCK, PADDLE, BALL = range(5)
+# a draw at this position sets the score instead of a tile
+SCORE_X, SCORE_Y = -1, 0
 
 
 def main():
-    with open('13.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('13.txt')
 
     print(f'part1: {part1(memory)}')
     print(f'part2: {part2(memory)}')
 
-def part1(memory):
-    program = IntcodeProgram(memory, [])
-    outputs, _ = program.run()
+class Arcade:
+    """Runs the game one frame at a time, a frame being the draws between joystick moves.
+
+    The screen is a bytearray of one tile per cell, sized from the first frame
+    and updated in place. A later draw outside it grows it. Draws are read as
+    x, y, tile triples straight out of the outputs of each run. Headless, only
+    the ball, the paddle and the score are kept and the screen stays None.
+    """
+    def __init__(self, memory, headless=False, free_play=False, program_cls=IntcodeProgram):
+        self.program = program_cls(memory, [])
+        if free_play:
+            # update memory address 0 to play for free
+            self.program.update(0, 2)
+        self.headless = headless
+        self.screen = None
+        self.width = 0
+        self.height = 0
+        self.ball = None
+        self.paddle = None
+        self.score = 0
+        self.frames = 0
+        self.seconds = 0.0
+
+    def draw(self, outputs):
+        screen = self.screen
+        width, height = self.width, self.height
+        ball, paddle, score = self.ball, self.paddle, self.score
+        values = iter(outputs)
+        for x, y, tile in zip(values, values, values):
+            if x == SCORE_X and y == SCORE_Y:
+                score = tile
+                continue
+            if tile == BALL:
+                ball = x
+            elif tile == PADDLE:
+                paddle = x
+            if screen is not None:
+                if not (0 <= x < width and 0 <= y < height):
+                    self._grow(x, y)
+                    screen = self.screen
+                    width, height = self.width, self.height
+                screen[y * width + x] = tile
+        self.ball, self.paddle, self.score = ball, paddle, score
+
+    def _allocate(self, outputs):
+        # the first frame draws every cell of the screen, the score aside
+        cells = [(x, y) for x, y in zip(outputs[0::3], outputs[1::3]) if (x, y) != (SCORE_X, SCORE_Y)]
+        self.width = max((x for x, _ in cells), default=-1) + 1
+        self.height = max((y for _, y in cells), default=-1) + 1
+        self.screen = bytearray(self.width * self.height)
+
+    def _grow(self, x, y):
+        """Make the screen big enough for a draw at x, y, keeping what is on it."""
+        if x < 0 or y < 0:
+            raise ValueError(f'draw at {x}, {y} is off the screen')
+        width = max(self.width, x + 1)
+        height = max(self.height, y + 1)
+        screen = bytearray(width * height)
+        for row in range(self.height):
+            screen[row * width:row * width + self.width] = self.screen[row * self.width:(row + 1) * self.width]
+        self.screen = screen
+        self.width, self.height = width, height
+
+    def frame(self, joystick=None):
+        """Run the game until it wants the next joystick move, returns whether it ended."""
+        if joystick is not None:
+            self.program.add_inputs([joystick])
+        outputs, complete = self.program.run()
+        if self.screen is None and not self.headless:
+            self._allocate(outputs)
+        self.draw(outputs)
+        self.frames += 1
+        return complete
+
+    def play(self):
+        """Play to the end keeping the paddle under the ball, returns the final score."""
+        start = time.perf_counter()
+        complete = self.frame()
+        while not complete:
+            complete = self.frame(get_joystick_move(self.ball, self.paddle))
+        self.seconds += time.perf_counter() - start
+        return self.score
+
+    def count(self, tile):
+        return self.screen.count(tile)
+
+    def fps(self):
+        return self.frames / self.seconds if self.seconds else 0.0
+
+    def render(self):
+        return '\n'.join(
+            ''.join(' #x_o'[tile] for tile in self.screen[start:start + self.width])
+            for start in range(0, len(self.screen), self.width or 1)
+        )
 
-    # map of location tuples (x, y) to their tile
-    states = {}
-    for start in range(0, len(outputs), 3):
-        location = tuple(outputs[start:start+2])
-        state = outputs[start+2]
-        states[location] = state
-
-    state_counts = Counter(states.values())
-    return state_counts[2]
+def part1(memory):
+    arcade = Arcade(memory)
+    arcade.frame()
+    return arcade.count(BLOCK)
 
 def get_joystick_move(ball, paddle):
     if ball == paddle:
@@ -173,34 +126,7 @@ def get_joystick_move(ball, paddle):
         return 1
 
 def part2(memory):
-    # update memory address 0 to play for free
-    memory[0] = 2
-
-    program = IntcodeProgram(memory, [])
-    outputs, complete = program.run()
-
-    # map of location tuples (x, y) to their tile
-    states = {}
-    while not complete:
-        # process outputs
-        while len(outputs) >= 3:
-            location, tile, outputs = tuple(outputs[0:2]), outputs[2], outputs[3:]
-            states[location] = tile
-            if tile == 4:
-                ball = location[0]
-            if tile == 3:
-                paddle = location[0]
-        # get new input
-        program.add_inputs([get_joystick_move(ball, paddle)])
-        # run game again
-        next_outputs, complete = program.run()
-        outputs += next_outputs
-
-    while len(outputs) >= 3:
-        location, tile, outputs = tuple(outputs[0:2]), outputs[2], outputs[3:]
-        states[location] = tile
-
-    return states[(-1, 0)]
+    return Arcade(memory, headless=True, free_play=True).play()
 
 
 if __name__ == '__main__':
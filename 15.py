@@ -1,152 +1,15 @@
 #!/usr/bin/env python
 
-from copy import copy
 from enum import Enum
 from queue import Queue
 
-
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 1_000_000
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
+from intcode_array import ArrayIntcodeProgram
+from intcode_image import load_program
 
 
 def main():
     global MEMORY
-    with open('15.txt', 'r') as file:
-        MEMORY = [int(v) for v in file.readline().strip().split(',')]
+    MEMORY = load_program('15.txt')
 
     print(f'part1: {part1()}')
     print(f'part2: {part2()}')
@@ -201,13 +64,15 @@ def get_neighbors(area, pos):
             neighbors.append((position, direction))
     return neighbors
 
-def explore_path(path, direction):
-    program = IntcodeProgram(MEMORY, path + [direction.value])
+def explore_path(program, direction):
+    # branch off the droid that is standing at the current position
+    program = program.fork()
+    program.add_inputs([direction.value])
 
     outputs, complete = program.run()
     if complete:
         raise Exception('program completd')
-    return outputs[-1]
+    return outputs[-1], program
 
 def part1():
     found = False
@@ -216,27 +81,26 @@ def part1():
     area = {}
     area[(0, 0)] = Tile.ROAD
 
-    # queue of tuples (path, position tuple)
+    # queue of tuples (distance, droid program, position tuple)
     explore = Queue()
-    explore.put(([], (0, 0)))
+    explore.put((0, ArrayIntcodeProgram(MEMORY), (0, 0)))
 
     # set of visited position tuples (x, y)
     visited = set()
 
     while not found:
-        path, pos = explore.get()
+        dist, program, pos = explore.get()
 
         neighbors = get_neighbors(area, pos)
         for neighbor, direction in neighbors:
             # try that direction
-            status = explore_path(path, direction)
+            status, moved = explore_path(program, direction)
             if status == 0:
                 area[neighbor] = Tile.WALL
             elif status == 1:
                 area[neighbor] = Tile.ROAD
                 if neighbor not in visited:
-                    new_path = copy(path) + [direction.value]
-                    explore.put((new_path, neighbor))
+                    explore.put((dist + 1, moved, neighbor))
             elif status == 2:
                 area[neighbor] = Tile.OXYGEN
                 found = True
@@ -245,7 +109,7 @@ def part1():
         # update visited
         visited.add(pos)
 
-    return len(path) + 1
+    return dist + 1
 
 def get_neighbors2(area, pos):
     x, y = pos
@@ -288,33 +152,31 @@ def part2():
     area = {}
     area[(0, 0)] = Tile.ROAD
 
-    # queue of tuples (path, position tuple)
+    # queue of tuples (distance, droid program, position tuple)
     explore = Queue()
-    explore.put(([], (0, 0)))
+    explore.put((0, ArrayIntcodeProgram(MEMORY), (0, 0)))
 
     # set of visited position tuples (x, y)
     visited = set()
 
     while not explore.empty():
-        path, pos = explore.get()
+        dist, program, pos = explore.get()
 
         neighbors = get_neighbors(area, pos)
         for neighbor, direction in neighbors:
             # try that direction
-            status = explore_path(path, direction)
+            status, moved = explore_path(program, direction)
             if status == 0:
                 area[neighbor] = Tile.WALL
             elif status == 1:
                 area[neighbor] = Tile.ROAD
                 if neighbor not in visited:
-                    new_path = copy(path) + [direction.value]
-                    explore.put((new_path, neighbor))
+                    explore.put((dist + 1, moved, neighbor))
             elif status == 2:
                 area[neighbor] = Tile.OXYGEN
                 oxygen = neighbor
                 if neighbor not in visited:
-                    new_path = copy(path) + [direction.value]
-                    explore.put((new_path, neighbor))
+                    explore.put((dist + 1, moved, neighbor))
 
         # update visited
         visited.add(pos)
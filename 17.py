@@ -1,151 +1,19 @@
 #!/usr/bin/env python
 
 
-from copy import copy
-from enum import Enum
-
-
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 1_000_000
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
+from intcode import IntcodeProgram
+from intcode_ascii import decode, encode
+from intcode_image import load_program
+
+# direction the robot faces for each of its symbols, as (dr, dc)
+DIRECTIONS = {'^': (-1, 0), '>': (0, 1), 'v': (1, 0), '<': (0, -1)}
+# longest routine the robot accepts, in characters without the newline
+MAX_ROUTINE_LEN = 20
+FUNCTION_NAMES = 'ABC'
 
 
 def main():
-    with open('17.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('17.txt')
 
     print(f'part1: {part1(memory)}')
     print(f'part2: {part2(memory)}')
@@ -177,14 +45,85 @@ def get_intersections(grid):
                     intersections.append((r, c))
     return intersections
 
-def part1(memory):
+def read_grid(memory):
     program = IntcodeProgram(memory, [])
     outputs, complete = program.run()
+    text, _ = decode(outputs)
+    return text.rstrip('\n').split('\n')
+
+def is_scaffold(grid, r, c):
+    return 0 <= r < len(grid) and 0 <= c < len(grid[r]) and grid[r][c] == '#'
+
+def walk_scaffold(grid):
+    """Moves of the robot following the scaffold to its end, turning only where it has to."""
+    r, c = next(
+        (r, c) for r, row in enumerate(grid) for c, cell in enumerate(row) if cell in DIRECTIONS
+    )
+    dr, dc = DIRECTIONS[grid[r][c]]
+    moves = []
+    while True:
+        if not moves and is_scaffold(grid, r + dr, c + dc):
+            # already facing along the scaffold
+            pass
+        elif is_scaffold(grid, r + dc, c - dr):
+            moves.append('R')
+            dr, dc = dc, -dr
+        elif is_scaffold(grid, r - dc, c + dr):
+            moves.append('L')
+            dr, dc = -dc, dr
+        else:
+            return moves
+
+        steps = 0
+        while is_scaffold(grid, r + dr, c + dc):
+            r, c = r + dr, c + dc
+            steps += 1
+        moves.append(str(steps))
+
+def routine_len(tokens):
+    return len(','.join(tokens))
+
+def compress(moves, num_functions=len(FUNCTION_NAMES), max_len=MAX_ROUTINE_LEN):
+    """Split moves into calls of at most num_functions movement functions.
+
+    Returns the indexes of the functions called in order and the functions as
+    tuples of moves, or None if the moves do not fit. Functions are tried as
+    every prefix of what is left, and (position, functions, calls) states
+    which came to nothing are remembered.
+    """
+    max_calls = (max_len + 1) // 2
+    failed = set()
+
+    def search(start, functions, calls):
+        if start == len(moves):
+            return calls, functions
+        key = (start, functions, len(calls))
+        if len(calls) == max_calls or key in failed:
+            return None
+
+        for idx, function in enumerate(functions):
+            if tuple(moves[start:start + len(function)]) == function:
+                result = search(start + len(function), functions, calls + (idx,))
+                if result:
+                    return result
+        if len(functions) < num_functions:
+            for end in range(start + 1, len(moves) + 1):
+                function = tuple(moves[start:end])
+                if routine_len(function) > max_len:
+                    break
+                if function in functions:
+                    continue
+                result = search(end, functions + (function,), calls + (len(functions),))
+                if result:
+                    return result
+
+        failed.add(key)
+        return None
+
+    return search(0, (), ())
 
-    grid_str = ''
-    for c in outputs:
-        grid_str += chr(c)
-    grid = grid_str.rstrip('\n').split('\n')
+def part1(memory):
+    grid = read_grid(memory)
 
     print_grid(grid)
 
@@ -192,34 +131,28 @@ def part1(memory):
     return sum([point[0] * point[1] for point in intersections])
 
 def part2(memory):
-    '''
-    Robot path is:
-        A:  R,10,R,10,R,6,R,4
-        B:  R,10,R,10,L,4
-        A:  R,10,R,10,R,6,R,4
-        C:  R,4,L,4,L,10,L,10
-        A:  R,10,R,10,R,6,R,4
-        B:  R,10,R,10,L,4
-        C:  R,4,L,4,L,10,L,10
-        B:  R,10,R,10,L,4
-        C:  R,4,L,4,L,10,L,10
-        B:  R,10,R,10,L,4
-    '''
-    # force robot to wake up
-    memory[0] = 2
+    moves = walk_scaffold(read_grid(memory))
+    compressed = compress(moves)
+    if compressed is None:
+        raise Exception(f'cannot fit the path into {len(FUNCTION_NAMES)} functions: {",".join(moves)}')
+    calls, functions = compressed
 
-    main_routine = 'A,B,A,C,A,B,C,B,C,B\n'
-    fn_A = 'R,10,R,10,R,6,R,4\n'
-    fn_B = 'R,10,R,10,L,4\n'
-    fn_C = 'R,4,L,4,L,10,L,10\n'
+    main_routine = ','.join(FUNCTION_NAMES[idx] for idx in calls) + '\n'
+    functions = [','.join(function) + '\n' for function in functions]
+    # unused functions still need an empty line
+    functions += ['\n'] * (len(FUNCTION_NAMES) - len(functions))
 
     continuous_video_feed = 'n\n'
 
     program = IntcodeProgram(memory, [])
-    for fn in [main_routine, fn_A, fn_B, fn_C, continuous_video_feed]:
-        program.add_inputs([ord(c) for c in fn])
+    # force robot to wake up
+    program.update(0, 2)
+    for fn in [main_routine, *functions, continuous_video_feed]:
+        program.add_inputs(encode(fn))
         outputs, complete = program.run()
-    return outputs[-1]
+    # the amount of dust comes after the last video frame
+    _, values = decode(outputs)
+    return values[-1]
 
 if __name__ == '__main__':
     main()
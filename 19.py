@@ -1,189 +1,130 @@
 #!/usr/bin/env python
 
+from itertools import product
 
-from copy import copy
-from enum import Enum
-
-
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 100
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
+from intcode import IntcodeProgram
+from intcode_batch import BatchIntcodeProgram
+from intcode_cache import RunCache
+from intcode_image import load_program
 
 
 def main():
-    with open('19.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('19.txt')
 
     print(f'part1: {part1(memory)}')
-    # print(f'part2: {part2(memory)}')
+    print(f'part2: {part2(memory)}')
 
 def part1(memory):
-    count = 0
-    for y in range(50):
-        row_count, _ = get_row(memory, 0, 50, y)
-        count += row_count
-    return count
-
-def get_row(memory, x_start, x_end, y):
-    x_range = []
-    count = 0
-    row = ''
-    for x in range(x_start, x_end):
-        program = IntcodeProgram(memory, [x, y])
-        outputs, _ = program.run()
-        row += '#' if outputs[-1] == 1 else '.'
-        if outputs[-1] == 1:
-            count += 1
-            x_range.append(x)
-    return count, (min(x_range), max(x_range)) if len(x_range) else (0, 0)
+    # probe the whole 50x50 grid in one batch
+    points = list(product(range(50), range(50)))
+    return sum(probe(memory, points))
+
+def probe(memory, points):
+    """Beam state (0 or 1) at every (x, y) point."""
+    outputs, _ = BatchIntcodeProgram(memory, points).run()
+    return [output[-1] for output in outputs]
+
+# the beam is taken to lie within x < BEAM_SPAN * (y + 1), no probe goes further
+BEAM_SPAN = 10
+# rows find_square looks at before giving up
+MAX_SQUARE_ROWS = 100_000
+
+
+class TractorBeam:
+    """Beam geometry found with as few drone deployments as possible.
+
+    Every probe result is memoized, and the left and right edges of a row are
+    found by walking from an estimate scaled off the nearest row already known.
+    With a RunCache the probes are also kept for later invocations.
+    """
+    def __init__(self, memory, first_row=100, cache=None):
+        self.memory = memory
+        self.cache = cache
+        # map of (x, y) to the beam state there
+        self.probes = {}
+        # map of y to the (left, right) pulled x of that row
+        self.rows = {}
+
+        # scan one row in full to have something to scale from
+        xs = range(BEAM_SPAN * first_row)
+        row = probe(memory, [(x, first_row) for x in xs])
+        pulled = [x for x, state in zip(xs, row) if state]
+        if not pulled:
+            raise Exception(f'no beam in row {first_row}')
+        self.rows[first_row] = (pulled[0], pulled[-1])
+
+    def pulled(self, x, y):
+        if (x, y) not in self.probes:
+            if self.cache is None:
+                outputs, _ = IntcodeProgram(self.memory, [x, y]).run()
+            else:
+                outputs, _ = self.cache.run(self.memory, [x, y])
+            self.probes[(x, y)] = outputs[-1]
+        return self.probes[(x, y)]
+
+    def edges(self, y):
+        """(left, right) pulled x of row y, None if the beam misses the row."""
+        if y in self.rows:
+            return self.rows[y]
+
+        known = min((row for row in self.rows if row and self.rows[row]), key=lambda row: abs(row - y))
+        known_left, known_right = self.rows[known]
+        limit = BEAM_SPAN * (y + 1)
+        left = min(known_left * y // known, limit)
+        right = min(max(known_right * y // known, left), limit)
+
+        # a pulled x between the estimates, or anywhere in the row if they missed
+        inside = next((x for x in range(left, right + 1) if self.pulled(x, y)), None)
+        if inside is None:
+            inside = next((x for x in range(limit + 1) if self.pulled(x, y)), None)
+            if inside is None:
+                self.rows[y] = None
+                return None
+            left = right = inside
+
+        # walk the estimates onto the edges, the pulled x of a row being contiguous
+        if inside == left:
+            while left > 0 and self.pulled(left - 1, y):
+                left -= 1
+        else:
+            left = inside
+        right = max(right, inside)
+        if self.pulled(right, y):
+            while right < limit and self.pulled(right + 1, y):
+                right += 1
+        else:
+            while not self.pulled(right, y):
+                right -= 1
+
+        self.rows[y] = (left, right)
+        return left, right
+
+    def fits(self, y, size):
+        """Left x of a size x size square with its top row at y, None if it does not fit."""
+        top = self.edges(y)
+        bottom = self.edges(y + size - 1)
+        if top and bottom and top[1] - bottom[0] + 1 >= size:
+            return bottom[0]
+        return None
+
+    def find_square(self, size):
+        """Closest (x, y) of a size x size square inside the beam.
+
+        Every row is checked from the top down, so the first one that fits is
+        the closest even where fitting rows are ragged. Each row's edges are
+        scaled off the row above, which takes a few probes.
+        """
+        for y in range(MAX_SQUARE_ROWS):
+            x = self.fits(y, size)
+            if x is not None:
+                return x, y
+        raise Exception(f'no {size}x{size} square in the first {MAX_SQUARE_ROWS} rows of the beam')
 
 def part2(memory):
-    goal = 100
-    y1 = 1300
-    while True:
-        count1, (min_x1, max_x1) = get_row(memory, y1 // 2, y1, y1)
-        if count1 > goal:
-            y2 = y1 + (goal - 1)
-            count2, (min_x2, max_x2) = get_row(memory, y2 // 2, y2, y2)
-            if count2 > goal and max_x1 - min_x2 == (goal - 1):
-                final_x, final_y = min_x2, y1
-                break
-        y1 += 1
+    with RunCache() as cache:
+        beam = TractorBeam(memory, cache=cache)
+        final_x, final_y = beam.find_square(100)
     return final_x * 10_000 + final_y
 
-
 if __name__ == '__main__':
     main()
@@ -1,236 +1,217 @@
 #!/usr/bin/env python
 
 
-from copy import copy
-from enum import Enum
-
-
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 100
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
+import re
+
+from intcode import IntcodeProgram
+from intcode_ascii import decode, encode
+from intcode_image import load_program
+from intcode_pool import worker_pool, worker_state
+
+# sensors the droid can read in each mode
+SENSORS = {'WALK': 'ABCD', 'RUN': 'ABCDEFGHI'}
+# longest springscript the droid accepts
+MAX_INSTRUCTIONS = 15
+# candidates of the same length tried on the droid at once
+BATCH_SIZE = 16
+# programs of each length the search goes on with. A narrow beam finds some
+# working springscript fast, the wider ones then look for shorter ones.
+BEAM_WIDTHS = (500, 5000)
+# cells a jump moves the droid forward
+JUMP = 4
 
 
 def main():
-    with open('21.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('21.txt')
 
-    print(f'part1: {part1(memory)}')
-    print(f'part2: {part2(memory)}')
+    for part, mode in ((1, 'WALK'), (2, 'RUN')):
+        springscript, damage = synthesize(memory, mode)
+        print(f'part{part}: {damage}')
+        print(f'shortest {mode} springscript found:\n{springscript}')
 
 def part1(memory):
-    return run_springdroid(memory, get_springscript1())
+    _, damage = synthesize(memory, 'WALK')
+    return damage
 
 def part2(memory):
-    return run_springdroid(memory, get_springscript2())
-
-def run_springdroid(memory, springscript):
-    program = IntcodeProgram(memory, [])
-
-    program.add_inputs([ord(c) for c in springscript])
-    outputs, complete = program.run()
-
-    draw = ''
-    for n in outputs:
-        try:
-            draw += chr(n)
-        except Exception:
-            # If the springdroid successfully makes it across, it will use an output instruction
-            # to indicate the amount of damage to the hull as a single giant integer outside the
-            # normal ASCII range.
-            return n
-    print(draw)
-    return -1
-
-def get_springscript1():
-    """
-    T, J start out False.
-    A, B, C, D - Ground(T), Hole(F)
-
-    JUMP:
-       ABCD
-    1) .###
-    2) #..#
-    3) #.##
-    """
-    instructions = [
-        # jump if any of A, B, C is a hole
-        'OR A T\n',
-        'AND B T\n',
-        'AND C T\n',
-        'NOT T J\n',
-        # jump only if D is ground
-        'AND D J\n',
-        'WALK\n',
+    _, damage = synthesize(memory, 'RUN')
+    return damage
+
+def boot_springdroid(memory):
+    """Snapshot of the springdroid waiting for its instructions."""
+    program = IntcodeProgram(memory)
+    program.run()
+    return program.snapshot()
+
+def try_springscript(springscript):
+    """Hull damage if the droid makes it across, otherwise the terrain it fell on."""
+    prompt, = worker_state()
+    program = IntcodeProgram.from_snapshot(prompt)
+    program.add_inputs(encode(springscript))
+    outputs, _ = program.run()
+    text, values = decode(outputs)
+    # If the springdroid successfully makes it across, it will use an output instruction
+    # to indicate the amount of damage to the hull as a single giant integer outside the
+    # normal ASCII range.
+    if values:
+        return values[-1], None
+    return None, re.search(r'^[#.]*#[#.]*$', text, re.M).group(0)
+
+def to_springscript(program, mode):
+    return ''.join(f'{op} {x} {y}\n' for op, x, y in program) + f'{mode}\n'
+
+def sensor_readings(terrain, num_sensors):
+    """Sensor readings at every position of terrain, ground is True and so is past its end."""
+    extended = terrain + '#' * num_sensors
+    return [
+        tuple(extended[x + offset] == '#' for offset in range(1, num_sensors + 1))
+        for x in range(len(terrain))
     ]
-    script = ''
-    for instruction in instructions:
-        script += instruction
-    return script
 
-def get_springscript2():
-    """
-    T, J start out False.
-    A, B, C, D, E, F, G, H, I - Ground(T), Hole(F)
-
-    JUMP:
-          *   *
-       ABCDEFGHI
-    1) .########
-    2) #..#.####
-    3) .#.##..##
-    4) #..##.##.
+def distance(terrain, jumps):
+    """How far a droid jumping at the positions where jumps(x) holds gets."""
+    x = 0
+    while x < len(terrain):
+        if terrain[x] == '.':
+            return x
+        x += JUMP if jumps(x) else 1
+    return len(terrain)
+
+def execute(program, registers, full):
+    """Run a springscript on register bitmasks, returns the final T and J."""
+    registers = dict(registers, T=0, J=0)
+    for op, x, y in program:
+        value = registers[x]
+        if op == 'AND':
+            value &= registers[y]
+        elif op == 'OR':
+            value |= registers[y]
+        else:
+            value = ~value & full
+        registers[y] = value
+    return registers['T'], registers['J']
+
+def candidates(terrains, sensors, beam_width, max_len=MAX_INSTRUCTIONS, reference=None):
+    """Springscripts by length which get across every known terrain.
+
+    Registers are evaluated on every sensor reading of the terrains at once, as
+    bitmasks with one bit per reading. Programs leaving T and J the same on all
+    readings are interchangeable here, so only the shortest one is kept. Once
+    there are more than beam_width programs of a length only the most promising
+    are extended, so from then on a shorter program may be missed. They are
+    the ones closest to the jumps of the reference program, or without one,
+    the ones getting the droid furthest.
     """
+    # the droid only ever decides standing on ground
+    readings_at = [
+        [reading if cell == '#' else None for cell, reading in zip(terrain, sensor_readings(terrain, len(sensors)))]
+        for terrain in terrains
+    ]
+    readings = sorted({reading for at in readings_at for reading in at if reading is not None})
+    index = {reading: idx for idx, reading in enumerate(readings)}
+    positions = [[index.get(reading) for reading in at] for at in readings_at]
+    full = (1 << len(readings)) - 1
+    registers = {
+        sensor: sum(1 << idx for idx, reading in enumerate(readings) if reading[offset])
+        for offset, sensor in enumerate(sensors)
+    }
     instructions = [
-        # 1) jump if A is a hole
-        'NOT A J\n',
-        # 2, 3) jump if C is a hole and H is not a hole
-        'NOT C T\n',
-        'AND H T\n',
-        'OR T J\n',
-        # 4) jump if B is a hole
-        'NOT B T\n',
-        'OR T J\n',
-        # walk if D is a hole
-        'AND D J\n',
-        'RUN\n',
+        (op, x, y) for op in ('AND', 'OR', 'NOT') for x in list(sensors) + ['T', 'J'] for y in ('T', 'J')
     ]
-    script = ''
-    for instruction in instructions:
-        script += instruction
-    return script
+
+    total = sum(len(terrain) for terrain in terrains)
+    progress = {}
+    def score(j):
+        # cells covered over all terrains when jumping where j says
+        if j not in progress:
+            progress[j] = sum(
+                distance(terrain, lambda x: j >> idxs[x] & 1)
+                for terrain, idxs in zip(terrains, positions)
+            )
+        return progress[j]
+
+    if reference is None:
+        def rank(state):
+            return -max(score(state[0]), score(state[1]))
+    else:
+        _, target = execute(reference, registers, full)
+        def rank(state):
+            # readings on which T and J agree with the reference jumps
+            return -sum(bin(~(value ^ target) & full).count('1') for value in state)
+
+    frontier = [((0, 0), ())]
+    seen = {(0, 0)}
+    if score(0) == total:
+        yield ()
+    for _ in range(max_len):
+        next_frontier = []
+        for (t, j), program in frontier:
+            registers['T'], registers['J'] = t, j
+            for op, x, y in instructions:
+                value = registers[x]
+                if op == 'AND':
+                    value &= registers[y]
+                elif op == 'OR':
+                    value |= registers[y]
+                else:
+                    value = ~value & full
+                state = (value, j) if y == 'T' else (t, value)
+                if state in seen:
+                    continue
+                seen.add(state)
+                extended = program + ((op, x, y),)
+                next_frontier.append((state, extended))
+                if score(state[1]) == total:
+                    yield extended
+        if len(next_frontier) > beam_width:
+            next_frontier.sort(key=lambda item: rank(item[0]))
+            del next_frontier[beam_width:]
+        frontier = next_frontier
+
+def synthesize(memory, mode, processes=None):
+    """Shortest springscript found which gets the droid across, and the hull damage.
+
+    Every candidate starts from a snapshot of the droid at its prompt, in
+    batches across a process pool. Each terrain a candidate falls on is added
+    to the known ones and the search starts over.
+    """
+    sensors = SENSORS[mode]
+    terrains = []
+    best = None
+    with worker_pool((boot_springdroid(memory),), processes) as pool:
+        for beam_width in BEAM_WIDTHS:
+            while True:
+                # only programs of one length per batch, so the first one that
+                # passes is the shortest this search can find
+                batch = []
+                max_len = len(best[0]) - 1 if best else MAX_INSTRUCTIONS
+                reference = best[0] if best else None
+                for program in candidates(terrains, sensors, beam_width, max_len, reference):
+                    if batch and len(program) > len(batch[0]) or len(batch) == BATCH_SIZE:
+                        break
+                    batch.append(program)
+                if not batch:
+                    break
+
+                springscripts = [to_springscript(program, mode) for program in batch]
+                known = set(terrains)
+                passing = None
+                for program, springscript, (damage, terrain) in zip(
+                    batch, springscripts, pool.map(try_springscript, springscripts)
+                ):
+                    if damage is not None:
+                        passing = passing or (program, damage)
+                    elif terrain in known:
+                        raise Exception(f'{springscript!r} fell on the known terrain {terrain}')
+                    elif terrain not in terrains:
+                        terrains.append(terrain)
+                if passing:
+                    best = passing
+
+    if best is None:
+        raise Exception(f'no springscript of up to {MAX_INSTRUCTIONS} instructions works for {mode}')
+    program, damage = best
+    return to_springscript(program, mode), damage
 
 if __name__ == '__main__':
     main()
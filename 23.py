@@ -1,207 +1,231 @@
 #!/usr/bin/env python
 
 
-from copy import copy
-from enum import Enum
-from queue import Queue
-
-
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 100
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
+import time
+from collections import deque
+from multiprocessing import Process, cpu_count
+from multiprocessing.sharedctypes import RawArray
+
+from intcode import IntcodeProgram
+from intcode_image import load_program
+from intcode_network import RingBuffer
+
+# empty polls in a row, without any output, before a computer counts as idle
+IDLE_POLLS = 2
+# packets each ring buffer between two shards can hold
+RING_SIZE = 4096
+# seconds an idle shard or the coordinator waits before polling again
+IDLE_SLEEP = 0.0001
+# status cells of every shard in a sharded network
+IDLE, SENT, RECEIVED = range(3)
+# address of the NAT, no computer gets it however large the network
+NAT_ADDR = 255
 
 
 class Computers:
-    def __init__(self, memory, n):
+    """Event driven network of NICs.
+
+    Only computers with something to do are run. A computer which keeps polling an
+    empty queue without sending anything is parked until a packet arrives for it,
+    so the network is idle exactly when no computer is left to run.
+
+    addrs limits the computers run here to part of the network, packets for the
+    others are passed to route(). Address 255 is the NAT's, so a network of more
+    than 255 computers skips it.
+    """
+    def __init__(self, memory, n, addrs=None):
         self.n = n
-        self.computers = self._create_computers(memory)
-        self.packets = [Queue() for _ in range(n)]
+        addrs = [addr for addr in (range(n) if addrs is None else addrs) if addr != NAT_ADDR]
+        self.computers = {addr: IntcodeProgram(memory, [addr]) for addr in addrs}
+        self.packets = {addr: deque() for addr in addrs}
         self.NAT = None
-
-    def _create_computers(self, memory):
-        computers = []
-        for addr in range(self.n):
-            computer = IntcodeProgram(memory, [addr])
-            outputs, _ = computer.run()
-            if len(outputs):
-                raise Exception(f'received output of length {len(outputs)}: {outputs}')
-            computers.append(computer)
-        return computers
-
-    def _get_inputs(self, addr):
-        queue = self.packets[addr]
-        if not queue.empty():
-            return queue.get()
+        # computers to run next, and how many empty polls each made in a row
+        self.ready = deque(addrs)
+        self.scheduled = dict.fromkeys(addrs, True)
+        self.idle_polls = dict.fromkeys(addrs, 0)
+        # number of times a computer was run
+        self.steps = 0
+
+    def send(self, addr, x, y):
+        self.packets[addr].append((x, y))
+        if not self.scheduled[addr]:
+            self.scheduled[addr] = True
+            self.ready.append(addr)
+
+    def route(self, addr, x, y):
+        """Deliver a packet for an address outside of the computers run here."""
+        if addr == NAT_ADDR:
+            self.NAT = (x, y)
         else:
-            return [-1]
+            raise Exception(f'received addr out of range: {addr}')
 
     def process_outputs(self, outputs):
-        while len(outputs) >= 3:
-            addr, x, y = outputs[0], outputs[1], outputs[2]
-            if 0 <= addr <= self.n:
-                self.packets[addr].put([x, y])
-            elif addr == 255:
-                self.NAT = [x, y]
+        for start in range(0, len(outputs) - 2, 3):
+            addr, x, y = outputs[start], outputs[start + 1], outputs[start + 2]
+            if addr != NAT_ADDR and addr in self.computers:
+                self.send(addr, x, y)
             else:
-                raise Exception(f'received addr out of range: {addr}')
-            outputs = outputs[3:]
+                self.route(addr, x, y)
 
-    def run(self):
-        """Go through all computers and run them once each.
+    def step(self):
+        """Run the next computer that has something to do.
 
         Run computer by:
-         1) sending a packet from its queue, -1 if no packet available.
-         2) processing output packets [addr, x, y] by adding [x, y] to the correct addr queue.
+         1) sending it all packets in its queue, -1 if no packet is available.
+         2) processing output packets [addr, x, y] by adding (x, y) to the correct addr queue.
         """
-        for addr in range(self.n):
-            computer = self.computers[addr]
-            computer.add_inputs(self._get_inputs(addr))
-            outputs, _ = computer.run()
-            self.process_outputs(outputs)
+        addr = self.ready.popleft()
+        computer = self.computers[addr]
+        queue = self.packets[addr]
+        polled = not queue
+        if polled:
+            computer.add_inputs([-1])
+        while queue:
+            computer.add_inputs(queue.popleft())
+
+        outputs, _ = computer.run()
+        self.process_outputs(outputs)
+        self.steps += 1
+
+        if polled and not outputs:
+            self.idle_polls[addr] += 1
+        else:
+            self.idle_polls[addr] = 0
 
-    def check_idle(self):
-        for packet in self.packets:
-            if not packet.empty():
-                return False
-        return True
+        if self.idle_polls[addr] < IDLE_POLLS or self.packets[addr]:
+            self.ready.append(addr)
+        else:
+            self.scheduled[addr] = False
+
+    def is_idle(self):
+        return not self.ready
+
+
+class Shard(Computers):
+    """Computers run by one worker process of a sharded network.
+
+    Computer addr belongs to shard addr % shards. Packets for other shards and
+    for the NAT go into the ring buffer towards them, outboxes[shards] being the
+    coordinator's. Packets which do not fit into a full ring wait their turn.
+    """
+    def __init__(self, memory, n, shard, shards, outboxes):
+        super().__init__(memory, n, range(shard, n, shards))
+        self.shards = shards
+        self.outboxes = outboxes
+        self.pending = [deque() for _ in outboxes]
+        # packets pushed into the ring buffers so far
+        self.sent = 0
+
+    def route(self, addr, x, y):
+        if addr == NAT_ADDR:
+            dst = self.shards
+        elif 0 <= addr < self.n:
+            dst = addr % self.shards
+        else:
+            raise Exception(f'received addr out of range: {addr}')
+        self.pending[dst].append((addr, x, y))
+        self.flush()
+
+    def flush(self):
+        """Push waiting packets, returns whether all of them made it."""
+        for outbox, pending in zip(self.outboxes, self.pending):
+            while pending and outbox.push(pending[0]):
+                pending.popleft()
+                self.sent += 1
+        return not any(self.pending)
+
+
+def run_shard(memory, n, shard, shards, rings, status):
+    """Worker process running one shard until the coordinator sets the stop cell."""
+    computers = Shard(memory, n, shard, shards, rings[shard])
+    inboxes = [rings[src][shard] for src in range(shards + 1)]
+    base = shard * 3
+    stop = len(status) - 1
+    while not status[stop]:
+        packets = [packet for inbox in inboxes for packet in inbox.pop_all()]
+        if packets:
+            status[base + IDLE] = 0
+            for addr, x, y in packets:
+                computers.send(addr, x, y)
+            status[base + RECEIVED] += len(packets)
+
+        flushed = computers.flush()
+        if computers.ready:
+            status[base + IDLE] = 0
+            computers.step()
+        elif flushed and not packets:
+            status[base + IDLE] = 1
+            time.sleep(IDLE_SLEEP)
+        status[base + SENT] = computers.sent
+
+def run_sharded(memory, n=50, shards=None, first_packet=False):
+    """Run the network spread over worker processes, coordinated from this one.
+
+    The coordinator plays the NAT. The network is idle once every shard reports
+    being idle and all packets sent were received, the same in two status reads
+    in a row. Returns the y of the first packet sent to the NAT if first_packet,
+    otherwise the first y the NAT delivers twice in a row.
+    """
+    shards = shards or cpu_count()
+    # rings[src][dst] carries packets from shard src to shard dst, the
+    # coordinator being shard number shards
+    rings = [[RingBuffer(RING_SIZE, 3) for _ in range(shards + 1)] for _ in range(shards + 1)]
+    # IDLE, SENT and RECEIVED of every shard, then the stop cell
+    status = RawArray('q', shards * 3 + 1)
+    workers = [
+        Process(target=run_shard, args=(list(memory), n, shard, shards, rings, status))
+        for shard in range(shards)
+    ]
+    for worker in workers:
+        worker.start()
+
+    inboxes = [rings[src][shards] for src in range(shards)]
+    # computer 0 belongs to shard 0
+    outbox = rings[shards][0]
+    sent = received = 0
+    NAT = None
+    last_y = None
+    last_status = None
+    try:
+        while True:
+            packets = [packet for inbox in inboxes for packet in inbox.pop_all()]
+            if packets:
+                if first_packet:
+                    return packets[0][2]
+                received += len(packets)
+                _, x, y = packets[-1]
+                NAT = (x, y)
+                last_status = None
+                continue
+
+            current = status[:-1]
+            shard_idle = all(current[IDLE::3])
+            balanced = sum(current[SENT::3]) + sent == sum(current[RECEIVED::3]) + received
+            if shard_idle and balanced and current == last_status:
+                if NAT is None:
+                    raise Exception('network went idle before the NAT received a packet')
+                x, y = NAT
+                if y == last_y:
+                    return y
+                last_y = y
+                # the network is idle, so the ring to computer 0 is empty
+                outbox.push((0, x, y))
+                sent += 1
+                last_status = None
+                continue
+
+            if not all(worker.is_alive() for worker in workers):
+                raise Exception('a shard worker exited early')
+            last_status = current
+            time.sleep(IDLE_SLEEP)
+    finally:
+        status[-1] = 1
+        for worker in workers:
+            worker.join()
 
 
 def main():
-    with open('23.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('23.txt')
 
     print(f'part1: {part1(memory)}')
     print(f'part2: {part2(memory)}')
@@ -209,35 +233,26 @@ def main():
 def part1(memory):
     computers = Computers(memory, 50)
 
-    while True:
-        computers.run()
-        if computers.NAT:
-            return computers.NAT[1]
-    return -1
+    while not computers.NAT:
+        computers.step()
+    return computers.NAT[1]
 
 def part2(memory):
     computers = Computers(memory, 50)
-    y_set = set()
+    last_y = None
 
     while True:
-        # check for idle state and send NAT to computer at addr 0
-        NAT = computers.NAT
-        if computers.check_idle() and NAT:
-            # look for first y value delivered by the NAT twice in a row
-            y = NAT[1]
-            if y in y_set:
+        computers.step()
+        if computers.is_idle():
+            if computers.NAT is None:
+                raise Exception('network went idle before the NAT received a packet')
+            # look for the first y value delivered by the NAT twice in a row
+            x, y = computers.NAT
+            if y == last_y:
                 return y
-            else:
-                y_set.add(y)
+            last_y = y
             # send NAT to computer at addr 0
-            computer = computers.computers[0]
-            computer.add_inputs(NAT)
-            outputs, _ = computer.run()
-            computers.process_outputs(outputs)
-        # send and receive packets
-        computers.run()
-
-    return -1
+            computers.send(0, x, y)
 
 if __name__ == '__main__':
     main()
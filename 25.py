@@ -1,158 +1,164 @@
 #!/usr/bin/env python
 
 
-from copy import copy
-from enum import Enum
-from queue import Queue
+import re
 import sys
+from collections import deque
+from multiprocessing import cpu_count
 
+from intcode import IntcodeProgram, WatchdogError
+from intcode_ascii import AsciiDecoder, decode, encode
+from intcode_image import load_program
+from intcode_pool import worker_pool, worker_state
 
-class Opcode(Enum):
-    ADD = 1
-    MULT = 2
-    INPUT = 3
-    OUTPUT = 4
-    JUMP_IF_TRUE = 5
-    JUMP_IF_FALSE = 6
-    LESS_THAN = 7
-    EQUALS = 8
-    SET_REL = 9
-    HALT = 99
-
-
-class IntcodeProgram:
-    def __init__(self, memory, input_vals):
-        self.m = copy(memory) + [0] * 1000
-        # current location of instruction pointer
-        self.ip = 0
-        self.inputs = input_vals
-        self.relative_base = 0
-
-    def get(self, mode):
-        val = None
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            val = self.m[addr]
-        # immediate mode
-        elif mode == 1:
-            val = self.m[self.ip]
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            val = self.m[addr]
-        else:
-            raise ValueError(f'received invalid parameter get mode: {mode}')
-        self.ip += 1
-        return val
-
-    def set(self, mode, val):
-        # position mode
-        if mode == 0:
-            addr = self.m[self.ip]
-            self.m[addr] = val
-        # relative mode
-        elif mode == 2:
-            addr = self.relative_base + self.m[self.ip]
-            self.m[addr] = val
-        else:
-            raise ValueError(f'received invalid parameter set mode: {mode}')
-        self.ip += 1
-
-    def add_inputs(self, new_inputs):
-        self.inputs += new_inputs
-
-    def run(self):
-        complete = False
-        outputs = []
-
-        param_lens = {
-            Opcode.ADD: 3,
-            Opcode.MULT: 3,
-            Opcode.INPUT: 1,
-            Opcode.OUTPUT: 1,
-            Opcode.JUMP_IF_TRUE: 2,
-            Opcode.JUMP_IF_FALSE: 2,
-            Opcode.LESS_THAN: 3,
-            Opcode.EQUALS: 3,
-            Opcode.SET_REL: 1,
-            Opcode.HALT: 0,
-        }
-
-        while self.ip < len(self.m):
-            instruction = self.m[self.ip]
-            opcode = Opcode(instruction % 100)
-            param_modes = self._get_modes(instruction // 100, param_lens[opcode])
-
-            self.ip += 1
-
-            if opcode == Opcode.ADD:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) + self.get(param_modes[1])
-                )
-            elif opcode == Opcode.MULT:
-                self.set(
-                    param_modes[2],
-                    self.get(param_modes[0]) * self.get(param_modes[1])
-                )
-            elif opcode == Opcode.INPUT:
-                if len(self.inputs) == 0:
-                    self.ip -= 1
-                    break
-                input_val = self.inputs.pop(0)
-                self.set(
-                    param_modes[0],
-                    input_val
-                )
-            elif opcode == Opcode.OUTPUT:
-                outputs.append(self.get(param_modes[0]))
-            elif opcode == Opcode.JUMP_IF_TRUE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if condition:
-                    self.ip = dest
-            elif opcode == Opcode.JUMP_IF_FALSE:
-                condition = self.get(param_modes[0])
-                dest = self.get(param_modes[1])
-                if not condition:
-                    self.ip = dest
-            elif opcode == Opcode.LESS_THAN:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) < self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.EQUALS:
-                self.set(
-                    param_modes[2],
-                    int(self.get(param_modes[0]) == self.get(param_modes[1]))
-                )
-            elif opcode == Opcode.SET_REL:
-                self.relative_base += self.get(param_modes[0])
-            elif opcode == Opcode.HALT:
-                complete = True
-                break
-            else:
-                raise ValueError(f'received invalid opcode: {opcode}')
-        return outputs, complete
-
-    def _get_modes(self, mode_digits, num):
-        modes = []
-        for _ in range(num):
-            mode = mode_digits % 10
-            mode_digits //= 10
-            modes.append(mode)
-        return modes
+# a room as the droid describes it, with its doors and items
+ROOM_RE = re.compile(
+    r'== (.+) ==\n(?s:.*?)\n\nDoors here lead:\n((?:- .+\n)+)(?:\nItems here:\n((?:- .+\n)+))?'
+)
+PASSWORD_RE = re.compile(r'typing (\d+) on the keypad')
+OPPOSITE = {'north': 'south', 'south': 'north', 'east': 'west', 'west': 'east'}
+CHECKPOINT = 'Security Checkpoint'
+# instructions a single command may take before the droid counts as stuck
+COMMAND_BUDGET = 1_000_000
 
 
 def main():
-    with open('25.txt', 'r') as file:
-        memory = [int(v) for v in file.readline().strip().split(',')]
+    memory = load_program('25.txt')
 
     print(f'part1: {part1(memory)}')
 
 def part1(memory):
+    paths, items, checkpoint_door = explore(memory)
+    droid, carried = collect(memory, paths, items)
+    return find_password(droid.snapshot(), carried, checkpoint_door)
+
+def command(droid, text):
+    """Send a command to the droid, returns its reply and whether the game is over."""
+    droid.add_inputs(encode(text + '\n'))
+    outputs, complete = droid.run()
+    text, _ = decode(outputs)
+    return text, complete
+
+def parse_rooms(text):
+    """(name, doors, items) of every room described in text, in order."""
+    return [
+        (name, parse_list(doors), parse_list(items))
+        for name, doors, items in ROOM_RE.findall(text)
+    ]
+
+def parse_list(block):
+    return [line[2:] for line in block.splitlines()]
+
+def is_safe(droid, item, door):
+    """Whether the droid can take item and still go through door afterwards."""
+    droid = droid.fork()
+    try:
+        _, complete = command(droid, f'take {item}')
+        if complete:
+            return False
+        text, complete = command(droid, door)
+    except WatchdogError:
+        return False
+    return not complete and bool(parse_rooms(text))
+
+def explore(memory):
+    """Map the ship by forking the droid at every door, without taking anything.
+
+    Returns the path of doors to every room, the safe items in every room and
+    the door from the security checkpoint to the pressure-sensitive floor.
     """
+    droid = IntcodeProgram(memory, max_steps=COMMAND_BUDGET, detect_cycles=True)
+    outputs, _ = droid.run()
+    name, doors, room_items = parse_rooms(decode(outputs)[0])[-1]
+
+    paths = {name: []}
+    items = {}
+    checkpoint_door = None
+    queue = deque([(droid, name, doors, room_items)])
+    while queue:
+        droid, name, doors, room_items = queue.popleft()
+        items[name] = [item for item in room_items if is_safe(droid, item, doors[0])]
+        for door in doors:
+            neighbor = droid.fork()
+            text, _ = command(neighbor, door)
+            rooms = parse_rooms(text)
+            # the floor throws a droid of the wrong weight back out
+            if rooms[-1][0] == name:
+                checkpoint_door = door
+                continue
+            next_name, next_doors, next_items = rooms[-1]
+            if next_name not in paths:
+                paths[next_name] = paths[name] + [door]
+                queue.append((neighbor, next_name, next_doors, next_items))
+
+    if CHECKPOINT not in paths or checkpoint_door is None:
+        raise Exception('did not find the security checkpoint')
+    return paths, items, checkpoint_door
+
+def collect(memory, paths, items):
+    """Droid which picked up every safe item and waits at the security checkpoint."""
+    droid = IntcodeProgram(memory)
+    droid.run()
+    carried = []
+    for name, room_items in items.items():
+        if not room_items:
+            continue
+        for door in paths[name]:
+            command(droid, door)
+        for item in room_items:
+            command(droid, f'take {item}')
+            carried.append(item)
+        for door in reversed(paths[name]):
+            command(droid, OPPOSITE[door])
+    for door in paths[CHECKPOINT]:
+        command(droid, door)
+    return droid, carried
+
+def gray(idx):
+    return idx ^ (idx >> 1)
+
+def try_subsets(span):
+    """Try the item subsets gray(start) to gray(stop - 1) on the floor.
+
+    Consecutive gray codes differ in one item, so every trial after the first
+    takes a single take or drop.
+    """
+    start, stop = span
+    snapshot, items, door = worker_state()
+    droid = IntcodeProgram.from_snapshot(snapshot)
+    for bit, item in enumerate(items):
+        if not gray(start) >> bit & 1:
+            command(droid, f'drop {item}')
+
+    for idx in range(start, stop):
+        if idx > start:
+            bit = (gray(idx) ^ gray(idx - 1)).bit_length() - 1
+            action = 'take' if gray(idx) >> bit & 1 else 'drop'
+            command(droid, f'{action} {items[bit]}')
+        text, complete = command(droid, door)
+        if complete:
+            match = PASSWORD_RE.search(text)
+            if match is None:
+                raise Exception(f'game ended without a password: {text}')
+            return int(match.group(1))
+    return None
+
+def find_password(snapshot, items, door, processes=None):
+    """Find the item subset the pressure-sensitive floor accepts, over a process pool."""
+    processes = processes or cpu_count()
+    subsets = 1 << len(items)
+    chunk = max(1, subsets // (processes * 4))
+    spans = [(start, min(start + chunk, subsets)) for start in range(0, subsets, chunk)]
+
+    with worker_pool((snapshot, items, door), processes) as pool:
+        for password in pool.imap_unordered(try_subsets, spans):
+            if password is not None:
+                return password
+    raise Exception('no subset of items passes the checkpoint')
+
+def play(memory):
+    """Play the adventure on stdin, notes from solving it this way:
+
     bad
     - giant electromagnet
     - photons
@@ -189,12 +195,19 @@ def part1(memory):
     - cake
     - jam, ornament, food ration, weather machine
     """
-    program = IntcodeProgram(memory, [])
+    program = IntcodeProgram(memory, [], detect_cycles=True)
+    decoder = AsciiDecoder()
     while True:
         script = sys.stdin.readline()
-        program.add_inputs([ord(c) for c in script])
-        outputs, complete = program.run()
-        sys.stdout.write(''.join(chr(c) for c in outputs))
+        before = program.snapshot()
+        program.add_inputs(encode(script))
+        try:
+            outputs, complete = program.run()
+        except WatchdogError as error:
+            # take back the command which got the droid stuck
+            program.restore(before)
+            outputs, complete = list(encode(f'{error}, command undone\n')), False
+        sys.stdout.write(''.join(f'{line}\n' for line in decoder.feed(outputs)))
         sys.stdout.flush()
         if complete:
             break
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import time
+from functools import partial
+from importlib import import_module
+from multiprocessing import cpu_count
+
+from intcode import IntcodeProgram
+from intcode_ascii import encode
+from intcode_compiler import CompiledIntcodeProgram
+from intcode_fusion import FusedIntcodeProgram
+from intcode_image import load_program
+from intcode_profile import Profile, ProfilingIntcodeProgram
+from intcode_trace import Trace, record
+
+# instructions the counting programs run between two updates of their count
+COUNT_BATCH = 1 << 20
+
+
+class Counting:
+    """Mixin counting the instructions a program executes, with fusion its dispatches."""
+    def __init__(self, memory, input_vals=None, **kwargs):
+        super().__init__(memory, input_vals, **kwargs)
+        self.count = 0
+
+    def _dispatch(self, ip, limit):
+        # a limit makes the loop count what it runs
+        if limit is None:
+            limit = COUNT_BATCH
+        try:
+            super()._dispatch(ip, limit)
+        finally:
+            self.count += limit - self.remaining
+
+
+class CountingIntcodeProgram(Counting, IntcodeProgram):
+    pass
+
+
+class CountingFusedIntcodeProgram(Counting, FusedIntcodeProgram):
+    pass
+
+
+def boost(program_cls, memory):
+    """Day 09 BOOST program in sensor boost mode."""
+    programs = [program_cls(memory, [2])]
+    programs[0].run()
+    return programs
+
+def network(program_cls, memory, n=50):
+    """Day 23 network of NICs, run until the NAT sends the same y twice in a row."""
+    programs = [program_cls(memory, [addr]) for addr in range(n)]
+    queues = [[] for _ in range(n)]
+    nat = None
+    last_y = None
+    while True:
+        if nat and not any(queues):
+            if nat[1] == last_y:
+                return programs
+            last_y = nat[1]
+            queues[0] += nat
+        for addr, program in enumerate(programs):
+            program.add_inputs(queues[addr] or [-1])
+            queues[addr] = []
+            outputs, _ = program.run()
+            for start in range(0, len(outputs), 3):
+                dest, x, y = outputs[start:start + 3]
+                if dest == 255:
+                    nat = [x, y]
+                else:
+                    queues[dest] += [x, y]
+
+def adventure(program_cls, memory):
+    """Day 25 droid up to the first command prompt and through a look around."""
+    program = program_cls(memory)
+    program.run()
+    program.add_inputs(encode('inv\n'))
+    program.run()
+    return [program]
+
+def bench(name, workload, memory, repeat=5):
+    instructions = sum(program.count for program in workload(CountingIntcodeProgram, memory))
+    dispatches = sum(program.count for program in workload(CountingFusedIntcodeProgram, memory))
+    print(f'{name}: {instructions:,} instructions, {dispatches:,} dispatches with fusion')
+    for program_cls in (IntcodeProgram, FusedIntcodeProgram, CompiledIntcodeProgram):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            workload(program_cls, memory)
+            best = min(best, time.perf_counter() - start)
+        print(f'  {program_cls.__name__:24} {instructions / best:12,.0f} instructions/s')
+
+def bench_shards(memory, max_shards=None, repeat=3):
+    """Time the sharded day 23 network on a growing number of worker processes."""
+    day23 = import_module('23')
+    print('23 sharded network')
+    for shards in range(1, (max_shards or cpu_count()) + 1):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            day23.run_sharded(memory, shards=shards)
+            best = min(best, time.perf_counter() - start)
+        print(f'  {shards:2} shards {best:10.3f}s')
+
+def bench_arcade(memory, repeat=3):
+    """Frames per second of a full day 13 game, drawn and headless."""
+    day13 = import_module('13')
+    print('13 arcade')
+    for headless in (False, True):
+        best = None
+        for _ in range(repeat):
+            arcade = day13.Arcade(memory, headless=headless, free_play=True)
+            arcade.play()
+            if best is None or arcade.fps() > best.fps():
+                best = arcade
+        mode = 'headless' if headless else 'framebuffer'
+        print(f'  {mode:12} {best.frames:,} frames in {best.seconds:.3f}s, {best.fps():10,.0f} frames/s')
+
+def bench_painting(memory, repeat=3):
+    """Steps per second of the day 11 robot painting the hull from a black panel."""
+    day11 = import_module('11')
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        steps = day11.paint(IntcodeProgram(memory), day11.Canvas())
+        best = min(best, time.perf_counter() - start)
+    print(f'11 painting robot: {steps:,} steps in {best:.3f}s, {steps / best:10,.0f} steps/s')
+
+def bench_profile(name, workload, memory):
+    """Flat profile, hot addresses and heatmap of a workload."""
+    profile = Profile()
+    workload(partial(ProfilingIntcodeProgram, profile=profile), memory)
+    print(f'{name} profile\n{profile.flat_profile(top=10)}')
+    hot = ', '.join(f'{addr} ({count:,})' for addr, count in profile.hot_addresses())
+    print(f'hot addresses: {hot}\n{profile.heatmap()}\n')
+
+def bench_trace(name, workload, memory, record_writes=False, seeks=100):
+    """Cost of recording a single program workload to a trace, and of seeking in it."""
+    path = os.path.join(tempfile.gettempdir(), f'intcode-{os.getpid()}.trace')
+    try:
+        seconds = record(workload, memory, path, record_writes)
+        trace = Trace(path)
+        start = time.perf_counter()
+        for idx in range(seeks):
+            trace.seek(trace.steps * idx // seeks)
+        seek = (time.perf_counter() - start) / seeks
+        print(
+            f'{name} trace: {trace.steps:,} steps recorded in {seconds:.3f}s, '
+            f'{os.path.getsize(path):,} bytes, {len(trace.checkpoint_steps)} checkpoints, '
+            f'{len(trace.inputs()):,} inputs, {len(trace.outputs()):,} outputs, '
+            f'{1000 * seek:.2f}ms a seek'
+        )
+    finally:
+        os.remove(path)
+
+
+def main():
+    bench('09 BOOST', boost, load_program('09.txt'))
+    bench('23 network', network, load_program('23.txt'))
+    bench_shards(load_program('23.txt'))
+    bench_arcade(load_program('13.txt'))
+    bench_painting(load_program('11.txt'))
+
+    bench_trace('09 BOOST', boost, load_program('09.txt'))
+    bench_trace('09 BOOST with writes', boost, load_program('09.txt'), record_writes=True)
+    bench_trace('25 adventure', adventure, load_program('25.txt'), record_writes=True)
+    print()
+
+    bench_profile('09 BOOST', boost, load_program('09.txt'))
+    bench_profile('23 network', network, load_program('23.txt'))
+    bench_profile('25 adventure', adventure, load_program('25.txt'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+
+from collections import deque, namedtuple
+from copy import copy
+from enum import Enum
+from itertools import product
+
+
+class Opcode(Enum):
+    ADD = 1
+    MULT = 2
+    INPUT = 3
+    OUTPUT = 4
+    JUMP_IF_TRUE = 5
+    JUMP_IF_FALSE = 6
+    LESS_THAN = 7
+    EQUALS = 8
+    SET_REL = 9
+    HALT = 99
+
+
+PARAM_LENS = {
+    Opcode.ADD: 3,
+    Opcode.MULT: 3,
+    Opcode.INPUT: 1,
+    Opcode.OUTPUT: 1,
+    Opcode.JUMP_IF_TRUE: 2,
+    Opcode.JUMP_IF_FALSE: 2,
+    Opcode.LESS_THAN: 3,
+    Opcode.EQUALS: 3,
+    Opcode.SET_REL: 1,
+    Opcode.HALT: 0,
+}
+
+# parameters which are written to, these cannot be in immediate mode
+WRITE_PARAMS = {
+    Opcode.ADD: 2,
+    Opcode.MULT: 2,
+    Opcode.INPUT: 0,
+    Opcode.LESS_THAN: 2,
+    Opcode.EQUALS: 2,
+}
+
+# Handler bodies, {0}, {1}, {2} are filled in with the parameter expressions.
+# Every handler takes (vm, m, ip) and returns the next instruction pointer, or
+# -2 - ip when execution has to stop at ip (halted or waiting for input).
+# A handler must not change any state before its last memory access, so that an
+# IndexError can be fixed up by growing memory and retrying the instruction.
+# The addresses of the parameters are worked out before the body, see
+# address_lines.
+TEMPLATES = {
+    Opcode.ADD: (
+        '{2} = {0} + {1}\n'
+        'return ip + 4'
+    ),
+    Opcode.MULT: (
+        '{2} = {0} * {1}\n'
+        'return ip + 4'
+    ),
+    Opcode.INPUT: (
+        'if not vm.inputs:\n'
+        '    return -2 - ip\n'
+        '{0} = vm.inputs[0]\n'
+        'vm.inputs.popleft()\n'
+        'return ip + 2'
+    ),
+    Opcode.OUTPUT: (
+        'vm.outputs.append({0})\n'
+        'return ip + 2'
+    ),
+    Opcode.JUMP_IF_TRUE: (
+        'if {0}:\n'
+        '    return {1}\n'
+        'return ip + 3'
+    ),
+    Opcode.JUMP_IF_FALSE: (
+        'if not {0}:\n'
+        '    return {1}\n'
+        'return ip + 3'
+    ),
+    Opcode.LESS_THAN: (
+        '{2} = 1 if {0} < {1} else 0\n'
+        'return ip + 4'
+    ),
+    Opcode.EQUALS: (
+        '{2} = 1 if {0} == {1} else 0\n'
+        'return ip + 4'
+    ),
+    Opcode.SET_REL: (
+        'vm.relative_base += {0}\n'
+        'return ip + 2'
+    ),
+    Opcode.HALT: (
+        'return -2 - ip'
+    ),
+}
+
+
+def param_expr(mode, offset, write=False):
+    """Python expression for the parameter at ip + offset in the given mode."""
+    # position and relative mode, at the address address_lines worked out
+    if mode == 0 or mode == 2:
+        return f'm[a{offset}]'
+    # immediate mode
+    elif mode == 1:
+        if write:
+            return None
+        return f'm[ip + {offset}]'
+    raise ValueError(f'received invalid parameter mode: {mode}')
+
+def address_lines(modes):
+    """Lines setting a1, a2, a3 to the addresses of the position and relative mode parameters.
+
+    A negative address raises IndexError, for _fault to report. Indexing m
+    with it would quietly wrap around to the end of memory.
+    """
+    lines = []
+    checks = []
+    for offset, mode in enumerate(modes, 1):
+        if mode == 0:
+            lines.append(f'a{offset} = m[ip + {offset}]')
+        elif mode == 2:
+            lines.append(f'a{offset} = vm.relative_base + m[ip + {offset}]')
+        else:
+            continue
+        checks.append(f'a{offset} < 0')
+    if checks:
+        lines += [f'if {" or ".join(checks)}:', '    raise IndexError']
+    return lines
+
+def decode(instruction):
+    """Split an instruction word into its opcode and parameter modes."""
+    opcode = Opcode(instruction % 100)
+    mode_digits = instruction // 100
+    modes = []
+    for _ in range(PARAM_LENS[opcode]):
+        modes.append(mode_digits % 10)
+        mode_digits //= 10
+    return opcode, tuple(modes)
+
+def encode(opcode, modes):
+    instruction = opcode.value
+    for idx, mode in enumerate(modes):
+        instruction += mode * 10 ** (idx + 2)
+    return instruction
+
+def build_handler(opcode, modes):
+    params = []
+    for idx, mode in enumerate(modes):
+        expr = param_expr(mode, idx + 1, write=WRITE_PARAMS.get(opcode) == idx)
+        if expr is None:
+            return None
+        params.append(expr)
+
+    name = f'{opcode.name.lower()}_{"".join(str(mode) for mode in modes)}'
+    lines = address_lines(modes) + TEMPLATES[opcode].format(*params).split('\n')
+    body = '\n    '.join(lines)
+    namespace = {}
+    exec(f'def {name}(vm, m, ip):\n    {body}\n', namespace)
+    return namespace[name]
+
+def build_decode_table():
+    """Map every valid instruction word to a handler specialised for its modes."""
+    table = {}
+    for opcode, num in PARAM_LENS.items():
+        for modes in product(range(3), repeat=num):
+            handler = build_handler(opcode, modes)
+            if handler is not None:
+                table[encode(opcode, modes)] = handler
+    return table
+
+DECODE_TABLE = build_decode_table()
+
+# frozen VM state, see IntcodeProgram.snapshot
+Snapshot = namedtuple('Snapshot', ['memory', 'ip', 'relative_base', 'inputs'])
+
+# memory grows in pages of this many cells as the program touches new addresses
+PAGE_SIZE = 1024
+# default hard limit on the number of memory cells
+MAX_MEMORY = 1 << 24
+# instructions between two checks of the watchdog
+CYCLE_CHECK_INTERVAL = 4096
+
+
+class WatchdogError(Exception):
+    """Raised by a watched run which used up its budget or got stuck in a loop."""
+
+
+class IntcodeProgram:
+    def __init__(self, memory, input_vals=None, max_memory=MAX_MEMORY, max_steps=None, detect_cycles=False):
+        # memory starts as a copy of the program and grows on demand
+        self.m = list(memory)
+        self.max_memory = max_memory
+        # watchdog, limit on the instructions of a single run, and whether a
+        # run which returns to an earlier state is stopped
+        self.max_steps = max_steps
+        self.detect_cycles = detect_cycles
+        # current location of instruction pointer
+        self.ip = 0
+        self.inputs = deque(input_vals) if input_vals is not None else deque()
+        self.outputs = []
+        self.relative_base = 0
+
+    def get(self, addr):
+        if addr < 0:
+            raise IndexError(f'negative address {addr}')
+        if addr >= len(self.m):
+            return 0
+        return self.m[addr]
+
+    def update(self, addr, new_val):
+        if addr < 0:
+            raise IndexError(f'negative address {addr}')
+        if addr >= len(self.m):
+            self._grow(addr)
+        self.m[addr] = new_val
+
+    def add_inputs(self, new_inputs):
+        self.inputs.extend(new_inputs)
+
+    def snapshot(self):
+        """Capture the current state, it stays valid however this program continues."""
+        return Snapshot(tuple(self.m), self.ip, self.relative_base, tuple(self.inputs))
+
+    def restore(self, snapshot):
+        self.m[:] = snapshot.memory
+        self.ip = snapshot.ip
+        self.relative_base = snapshot.relative_base
+        self.inputs = deque(snapshot.inputs)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, max_memory=MAX_MEMORY):
+        program = cls(snapshot.memory, snapshot.inputs, max_memory)
+        program.ip = snapshot.ip
+        program.relative_base = snapshot.relative_base
+        return program
+
+    def fork(self):
+        """Return an independent program continuing from the current state."""
+        program = copy(self)
+        program.m = self.m[:]
+        program.inputs = deque(self.inputs)
+        program.outputs = []
+        return program
+
+    def run(self):
+        """Run until the program halts or needs more input.
+
+        Returns the outputs produced during this run and whether the program halted.
+        """
+        outputs = self.outputs = []
+        complete = self._execute()
+        return outputs, complete
+
+    def stream(self, group=1):
+        """Run the program as a generator.
+
+        Yields every output value, or tuples of group values. When the program
+        needs input it yields None, send() a value or a list of values to go on.
+        send() raises StopIteration if that input makes the program halt without
+        output, so a for loop over the stream should add_inputs() instead and
+        let the loop go on.
+        """
+        buffer = self.outputs = deque()
+        while True:
+            complete = self._execute()
+            while len(buffer) >= group:
+                if group == 1:
+                    sent = yield buffer.popleft()
+                else:
+                    sent = yield tuple(buffer.popleft() for _ in range(group))
+                if sent is not None:
+                    self._send(sent)
+            if complete:
+                return
+            if not self.inputs:
+                sent = yield None
+                if sent is not None:
+                    self._send(sent)
+
+    def _send(self, value):
+        if isinstance(value, int):
+            self.inputs.append(value)
+        else:
+            self.inputs.extend(value)
+
+    def _execute(self):
+        """Run until halted or blocked on input, sending outputs to self.outputs.
+
+        The instructions run in _dispatch, which subclasses replace with their
+        own loops. This loop around it recovers from faults and, with max_steps
+        or detect_cycles set, keeps the watchdog, so every interpreter gets both.
+        """
+        watched = self.max_steps is not None or self.detect_cycles
+        steps = 0
+        states = set()
+        limit = None
+        ip = self.ip
+        while ip >= 0:
+            if watched:
+                limit = self._watchdog(ip, steps, states)
+            try:
+                self._dispatch(ip, limit)
+            except KeyError:
+                ip = self.ip
+                raise ValueError(f'received invalid instruction {self.m[ip]} at address {ip}') from None
+            except IndexError:
+                # the instruction at ip touched memory past the end, grow and retry it
+                self._fault(self.ip)
+            if watched:
+                steps += limit - self.remaining
+            ip = self.ip
+
+        self.ip = ip = -2 - ip
+        return self.m[ip] == Opcode.HALT.value
+
+    def _dispatch(self, ip, limit):
+        """Execute instructions from ip until the program stops, or limit of them ran.
+
+        Leaves the ip to go on from in self.ip, -2 - ip if execution stopped
+        at ip, and what is left of limit in self.remaining. Both are set when
+        an instruction raises too, the ip being that of the instruction. The
+        instruction execution stopped at did not execute, so it does not count
+        toward the limit, and loops counting instructions leave it out.
+        """
+        m = self.m
+        table = DECODE_TABLE
+        try:
+            if limit is None:
+                while ip >= 0:
+                    ip = table[m[ip]](self, m, ip)
+            else:
+                while ip >= 0 and limit:
+                    ip = table[m[ip]](self, m, ip)
+                    limit -= 1
+                if ip < 0:
+                    limit += 1
+        finally:
+            self.ip = ip
+            self.remaining = limit
+
+    def _watchdog(self, ip, steps, states):
+        """Instructions the run may go on for, raises WatchdogError once it went wrong.
+
+        Called between batches of at most CYCLE_CHECK_INTERVAL instructions.
+        Each time the state is sampled as the ip, relative base, inputs left
+        and a hash of memory. The program is deterministic, so seeing a sample
+        again means it loops forever.
+        """
+        if self.max_steps is not None and steps >= self.max_steps:
+            raise WatchdogError(f'run used up its budget of {self.max_steps} instructions at address {ip}')
+        if self.detect_cycles:
+            state = (ip, self.relative_base, len(self.inputs), hash(tuple(self.m)))
+            if state in states:
+                raise WatchdogError(f'run is stuck in a loop at address {ip}')
+            states.add(state)
+        if self.max_steps is not None:
+            return min(CYCLE_CHECK_INTERVAL, self.max_steps - steps)
+        return CYCLE_CHECK_INTERVAL
+
+    def _fault(self, ip):
+        m = self.m
+        if ip >= len(m):
+            self._grow(ip)
+            return
+
+        _, modes = decode(m[ip])
+        for offset, mode in enumerate(modes, 1):
+            if ip + offset >= len(m):
+                self._grow(ip + offset)
+                return
+            if mode == 0:
+                addr = m[ip + offset]
+            elif mode == 2:
+                addr = self.relative_base + m[ip + offset]
+            else:
+                continue
+            if addr < 0:
+                raise IndexError(f'instruction at {ip} accessed negative address {addr}')
+            if addr >= len(m):
+                self._grow(addr)
+                return
+        raise IndexError(f'instruction at {ip} accessed memory out of range')
+
+    def _grow(self, addr):
+        if addr >= self.max_memory:
+            raise MemoryError(f'address {addr} is past the memory limit of {self.max_memory} cells')
+        size = min(self.max_memory, (addr // PAGE_SIZE + 1) * PAGE_SIZE)
+        self.m.extend([0] * (size - len(self.m)))
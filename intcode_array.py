@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+from array import array
+from collections import deque
+
+from intcode import IntcodeProgram, Snapshot
+
+
+def int64_memory(values):
+    """array of 64-bit cells holding values, or a list if some do not fit."""
+    try:
+        return array('q', values)
+    except OverflowError:
+        return list(values)
+
+
+class ArrayIntcodeProgram(IntcodeProgram):
+    """IntcodeProgram keeping memory in an array of 64-bit machine integers.
+
+    That takes 8 bytes a cell, and forks and snapshots copy memory in one block.
+    A value which does not fit into 64 bits raises OverflowError on its store,
+    before anything else changed, so the program then moves its memory to a
+    list of Python ints and retries the instruction.
+    """
+    def __init__(self, memory, input_vals=None, **kwargs):
+        super().__init__((), input_vals, **kwargs)
+        self.m = int64_memory(memory)
+
+    def update(self, addr, new_val):
+        try:
+            super().update(addr, new_val)
+        except OverflowError:
+            self._promote()
+            super().update(addr, new_val)
+
+    def snapshot(self):
+        memory = self.m[:] if type(self.m) is array else tuple(self.m)
+        return Snapshot(memory, self.ip, self.relative_base, tuple(self.inputs))
+
+    def restore(self, snapshot):
+        self.m = int64_memory(snapshot.memory)
+        self.ip = snapshot.ip
+        self.relative_base = snapshot.relative_base
+        self.inputs = deque(snapshot.inputs)
+
+    def _promote(self):
+        self.m = list(self.m)
+
+    def _dispatch(self, ip, limit):
+        try:
+            super()._dispatch(ip, limit)
+        except OverflowError:
+            # the instruction stored nothing, _execute retries it on the list
+            self._promote()
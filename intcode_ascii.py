@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+NEWLINE = ord('\n')
+
+
+class NonAscii(int):
+    """Output value outside the ASCII range, like the hull damage of day 21."""
+
+
+def encode(text):
+    """Input values for a line or more of text."""
+    return text.encode('ascii')
+
+
+class AsciiDecoder:
+    """Turns the outputs of an ASCII Intcode program into lines of text.
+
+    Outputs can be fed in any pieces, text after the last newline waits in the
+    buffer for the rest of its line. Values outside the ASCII range come out
+    as NonAscii events between the lines.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, outputs):
+        """Lines completed by outputs, without their newlines, and any NonAscii values."""
+        try:
+            data = bytes(outputs)
+        except ValueError:
+            data = None
+        if data is not None and data.isascii():
+            self.buffer += data
+            return self._lines()
+
+        # slicing below needs a list, stream() hands out a deque
+        outputs = list(outputs)
+        events = []
+        start = 0
+        for idx, value in enumerate(outputs):
+            if not 0 <= value < 128:
+                self.buffer += bytes(outputs[start:idx])
+                events += self._lines()
+                events.append(NonAscii(value))
+                start = idx + 1
+        self.buffer += bytes(outputs[start:])
+        return events + self._lines()
+
+    def flush(self):
+        """Text received since the last newline."""
+        text = self.buffer.decode('ascii')
+        self.buffer.clear()
+        return text
+
+    def _lines(self):
+        buffer = self.buffer
+        end = buffer.rfind(NEWLINE)
+        if end < 0:
+            return []
+        lines = buffer[:end].decode('ascii').split('\n')
+        del buffer[:end + 1]
+        return lines
+
+
+def decode(outputs):
+    """Text of a complete run's outputs, and the NonAscii values among them."""
+    decoder = AsciiDecoder()
+    events = decoder.feed(outputs)
+    text = ''.join(event + '\n' for event in events if type(event) is str) + decoder.flush()
+    return text, [event for event in events if type(event) is NonAscii]
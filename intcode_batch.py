@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+from itertools import repeat
+from operator import add, eq, lt, mul
+
+from intcode import DECODE_TABLE, MAX_MEMORY, Opcode, decode
+
+# instruction word to (opcode, modes) for every valid instruction
+DECODED = {instruction: decode(instruction) for instruction in DECODE_TABLE}
+
+OPERATORS = {
+    Opcode.ADD: add,
+    Opcode.MULT: mul,
+    Opcode.LESS_THAN: lt,
+    Opcode.EQUALS: eq,
+}
+
+
+def apply(func, a, b):
+    """Apply func to two cell values, either of which may be a list of lane values."""
+    if type(a) is list:
+        if type(b) is list:
+            return list(map(func, a, b))
+        return list(map(func, a, repeat(b)))
+    if type(b) is list:
+        return list(map(func, repeat(a), b))
+    return func(a, b)
+
+
+class Cohort:
+    """Lanes which share an instruction pointer and relative base.
+
+    A memory cell holds a single value when it is the same for every lane,
+    otherwise a list with one value per lane.
+    """
+    def __init__(self, lanes, m, lane_cells, ip, relative_base, input_pos):
+        self.lanes = lanes
+        self.m = m
+        # addresses of the cells holding a list of lane values
+        self.lane_cells = lane_cells
+        self.ip = ip
+        self.relative_base = relative_base
+        # number of inputs every lane has read so far
+        self.input_pos = input_pos
+
+    def select(self, idxs):
+        """New cohort of the lanes at the given positions in this cohort."""
+        m = list(self.m)
+        lane_cells = set(self.lane_cells)
+        for addr in self.lane_cells:
+            values = self.m[addr]
+            m[addr] = [values[idx] for idx in idxs]
+        lanes = [self.lanes[idx] for idx in idxs]
+        return Cohort(lanes, m, lane_cells, self.ip, self.relative_base, self.input_pos)
+
+    def split(self, addr, key=None):
+        """Split lanes into cohorts by the value of the cell at addr, or by key(value)."""
+        groups = {}
+        for idx, value in enumerate(self.m[addr]):
+            groups.setdefault(value if key is None else key(value), []).append(idx)
+
+        cohorts = []
+        for value, idxs in groups.items():
+            cohort = self.select(idxs)
+            if key is None:
+                cohort.m[addr] = value
+                cohort.lane_cells.discard(addr)
+            cohorts.append(cohort)
+        return cohorts
+
+
+class BatchIntcodeProgram:
+    """Runs the same Intcode program over many input vectors in lockstep.
+
+    Lanes execute each instruction together, decoding it once for all of them.
+    When lanes disagree on a branch, an address or the relative base, they are
+    split into separate cohorts which carry on independently.
+    """
+    def __init__(self, memory, input_vectors, max_memory=MAX_MEMORY):
+        self.max_memory = max_memory
+        self.inputs = [list(vector) for vector in input_vectors]
+        self.outputs = [[] for _ in self.inputs]
+        self.complete = [False for _ in self.inputs]
+        lanes = list(range(len(self.inputs)))
+        self.cohorts = [Cohort(lanes, list(memory), set(), 0, 0, 0)] if lanes else []
+
+    def run(self):
+        """Run every lane until it halts or runs out of input.
+
+        Returns the outputs of every lane and whether each lane halted.
+        """
+        while self.cohorts:
+            cohort = self.cohorts.pop()
+            self.cohorts += self._execute(cohort)
+        return self.outputs, self.complete
+
+    def _read(self, cohort, addr):
+        if addr < 0:
+            raise IndexError(f'instruction at {cohort.ip} accessed negative address {addr}')
+        if addr >= len(cohort.m):
+            return 0
+        return cohort.m[addr]
+
+    def _write(self, cohort, addr, value):
+        m = cohort.m
+        if addr < 0:
+            raise IndexError(f'instruction at {cohort.ip} accessed negative address {addr}')
+        if addr >= len(m):
+            if addr >= self.max_memory:
+                raise MemoryError(f'address {addr} is past the memory limit of {self.max_memory} cells')
+            m.extend([0] * (addr + 1 - len(m)))
+        m[addr] = value
+        if type(value) is list:
+            cohort.lane_cells.add(addr)
+        else:
+            cohort.lane_cells.discard(addr)
+
+    def _execute(self, cohort):
+        """Run a cohort until it halts or blocks, returns any cohorts split off from it."""
+        while True:
+            ip = cohort.ip
+            word = self._read(cohort, ip)
+            if type(word) is list:
+                return cohort.split(ip)
+            if word not in DECODED:
+                raise ValueError(f'received invalid instruction {word} at address {ip}')
+            opcode, modes = DECODED[word]
+
+            # resolve parameter addresses, lanes must agree on them
+            addrs = []
+            for offset, mode in enumerate(modes, 1):
+                param = self._read(cohort, ip + offset)
+                if mode == 1:
+                    addrs.append(None)
+                    continue
+                if type(param) is list:
+                    return cohort.split(ip + offset)
+                addrs.append(param if mode == 0 else cohort.relative_base + param)
+
+            def value(idx):
+                if addrs[idx] is None:
+                    return self._read(cohort, ip + idx + 1)
+                return self._read(cohort, addrs[idx])
+
+            if opcode in OPERATORS:
+                self._write(cohort, addrs[2], apply(OPERATORS[opcode], value(0), value(1)))
+                cohort.ip += 4
+            elif opcode == Opcode.INPUT:
+                pos = cohort.input_pos
+                waiting = [idx for idx, lane in enumerate(cohort.lanes) if pos >= len(self.inputs[lane])]
+                if waiting:
+                    # lanes out of input stop here, the rest carry on
+                    if len(waiting) == len(cohort.lanes):
+                        return []
+                    waiting = set(waiting)
+                    ready = [idx for idx in range(len(cohort.lanes)) if idx not in waiting]
+                    return [cohort.select(ready)]
+                values = [self.inputs[lane][pos] for lane in cohort.lanes]
+                self._write(cohort, addrs[0], values if len(set(values)) > 1 else values[0])
+                cohort.input_pos += 1
+                cohort.ip += 2
+            elif opcode == Opcode.OUTPUT:
+                output = value(0)
+                if type(output) is list:
+                    for lane, lane_value in zip(cohort.lanes, output):
+                        self.outputs[lane].append(int(lane_value))
+                else:
+                    for lane in cohort.lanes:
+                        self.outputs[lane].append(int(output))
+                cohort.ip += 2
+            elif opcode in (Opcode.JUMP_IF_TRUE, Opcode.JUMP_IF_FALSE):
+                condition = value(0)
+                if type(condition) is list:
+                    if any(condition) and not all(condition):
+                        return cohort.split(addrs[0] if addrs[0] is not None else ip + 1, key=bool)
+                    condition = condition[0]
+                if bool(condition) == (opcode == Opcode.JUMP_IF_TRUE):
+                    dest = value(1)
+                    if type(dest) is list:
+                        return cohort.split(addrs[1] if addrs[1] is not None else ip + 2)
+                    cohort.ip = dest
+                else:
+                    cohort.ip += 3
+            elif opcode == Opcode.SET_REL:
+                delta = value(0)
+                if type(delta) is list:
+                    return cohort.split(addrs[0] if addrs[0] is not None else ip + 1)
+                cohort.relative_base += delta
+                cohort.ip += 2
+            elif opcode == Opcode.HALT:
+                for lane in cohort.lanes:
+                    self.complete[lane] = True
+                return []
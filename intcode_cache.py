@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import hashlib
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+from intcode import IntcodeProgram
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.intcode_cache')
+# bytes of entries the file keeps, the least recently used go first
+MAX_BYTES = 4 << 20
+MAGIC = b'ICC1'
+KEY_SIZE = 16
+
+
+def write_varint(out, value):
+    """Append value to the bytearray out, zigzag encoded in 7-bit groups."""
+    value = value << 1 if value >= 0 else (-value << 1) - 1
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    """Value encoded at pos of data, and the position after it."""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), pos
+
+def encode_values(values):
+    out = bytearray()
+    write_varint(out, len(values))
+    for value in values:
+        write_varint(out, value)
+    return bytes(out)
+
+def replace_file(path, *chunks):
+    """Write chunks to path in one step, so readers see the old file or the new one."""
+    tmp = f'{path}.{os.getpid()}'
+    with open(tmp, 'wb') as file:
+        for chunk in chunks:
+            file.write(chunk)
+    os.replace(tmp, path)
+
+@lru_cache(maxsize=64)
+def program_hash(memory):
+    """Digest of a program given as a tuple of its cells."""
+    return hashlib.blake2b(encode_values(memory), digest_size=KEY_SIZE).digest()
+
+def run_key(memory, inputs):
+    return hashlib.blake2b(
+        program_hash(tuple(memory)) + encode_values(inputs), digest_size=KEY_SIZE
+    ).digest()
+
+
+class RunCache:
+    """Outputs of Intcode runs from the start of a program, kept in a file between invocations.
+
+    An entry maps the hash of the program and its whole input sequence to the
+    outputs of running it until it halts or needs more input, and whether it
+    halted. Programs are deterministic, so that is all a repeat run would
+    give. Entries are kept in least recently used order and written back on
+    save(), merged with whatever other processes saved in the meantime and cut
+    down to max_bytes.
+    """
+    def __init__(self, path=CACHE_FILE, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        # map of key to its encoded entry, least recently used first
+        self.entries = self._load()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
+
+    def get(self, memory, inputs):
+        """(outputs, halted) of a cached run, or None."""
+        key = run_key(memory, inputs)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        self.dirty = True
+        halted = entry[0]
+        count, pos = read_varint(entry, 1)
+        outputs = []
+        for _ in range(count):
+            value, pos = read_varint(entry, pos)
+            outputs.append(value)
+        return outputs, bool(halted)
+
+    def put(self, memory, inputs, outputs, halted):
+        key = run_key(memory, inputs)
+        self.entries[key] = bytes([halted]) + encode_values(outputs)
+        self.entries.move_to_end(key)
+        self.dirty = True
+
+    def run(self, memory, inputs=(), program_cls=IntcodeProgram):
+        """Same as program_cls(memory, inputs).run(), from the cache when it can be."""
+        cached = self.get(memory, inputs)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        outputs, halted = program_cls(memory, list(inputs)).run()
+        self.put(memory, inputs, outputs, halted)
+        return outputs, halted
+
+    def save(self):
+        if not self.dirty:
+            return
+        entries = self._load()
+        # entries saved by others since we loaded count as the oldest
+        for key in self.entries:
+            entries.pop(key, None)
+        entries.update(self.entries)
+
+        size = sum(KEY_SIZE + len(entry) for entry in entries.values())
+        while entries and size > self.max_bytes:
+            _, entry = entries.popitem(last=False)
+            size -= KEY_SIZE + len(entry)
+
+        data = bytearray(MAGIC)
+        for key, entry in entries.items():
+            data += key
+            write_varint(data, len(entry))
+            data += entry
+        replace_file(self.path, data)
+        self.entries = entries
+        self.dirty = False
+
+    def _load(self):
+        entries = OrderedDict()
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return entries
+        if data[:len(MAGIC)] != MAGIC:
+            return entries
+
+        pos = len(MAGIC)
+        try:
+            while pos < len(data):
+                key = data[pos:pos + KEY_SIZE]
+                size, pos = read_varint(data, pos + KEY_SIZE)
+                if pos + size > len(data):
+                    break
+                entries[key] = data[pos:pos + size]
+                pos += size
+        except IndexError:
+            # truncated by a crash, keep what was complete
+            pass
+        return entries
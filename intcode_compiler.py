@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+from intcode import (
+    DECODE_TABLE,
+    PARAM_LENS,
+    WRITE_PARAMS,
+    IntcodeProgram,
+    Opcode,
+    decode,
+)
+
+# longest run of instructions compiled into one block
+MAX_BLOCK_LEN = 32
+# number of compiled variants kept for each start address
+MAX_VARIANTS = 8
+
+# compiled blocks shared between programs, start address to a list of
+# (code addresses, code words, highest fixed address, block function)
+BLOCK_CACHE = {}
+
+
+def build_write_table():
+    """Map instruction words that write memory to the index and mode of the written param."""
+    table = {}
+    for instruction in DECODE_TABLE:
+        opcode, modes = decode(instruction)
+        if opcode in WRITE_PARAMS:
+            idx = WRITE_PARAMS[opcode]
+            table[instruction] = (idx, modes[idx])
+    return table
+
+WRITE_TABLE = build_write_table()
+
+def offset_expr(base, offset):
+    if offset < 0:
+        return f'{base} - {-offset}'
+    return f'{base} + {offset}'
+
+def generate_block(start, instructions):
+    """Python source for a function running the given instructions in order.
+
+    instructions holds (addr, opcode, modes, params, dynamic) tuples. Params are
+    resolved to constants, except the dynamic ones which the program itself
+    rewrites and so are read from memory every time. Like an interpreter handler
+    the function returns the next instruction pointer.
+    """
+    has_rel = any(opcode == Opcode.SET_REL for _, opcode, _, _, _ in instructions)
+    has_write = any(opcode in WRITE_PARAMS for _, opcode, _, _, _ in instructions)
+    has_output = any(opcode == Opcode.OUTPUT for _, opcode, _, _, _ in instructions)
+
+    # offsets from the relative base on entry of the fixed relative mode accesses
+    offsets = []
+    delta = 0
+    for _, opcode, modes, params, dynamic in instructions:
+        for mode, param, is_dynamic in zip(modes, params, dynamic):
+            if mode == 2 and not is_dynamic:
+                offsets.append(delta + param)
+        if opcode == Opcode.SET_REL:
+            delta += params[0]
+
+    def leave(target, indent=''):
+        if has_rel:
+            return [f'{indent}vm.relative_base = rb', f'{indent}return {target}']
+        return [f'{indent}return {target}']
+
+    lines = []
+    if has_rel or offsets:
+        lines.append('rb = vm.relative_base')
+    if offsets:
+        # let the interpreter grow memory or report a bad address
+        low, high = offset_expr('rb', min(offsets)), offset_expr('rb', max(offsets))
+        lines.append(f'if {low} < 0 or {high} >= len(m):')
+        lines.append(f'    return vm._step({start})')
+    if has_write:
+        lines.append('watched = vm.watched')
+    if has_output:
+        lines.append('out = vm.outputs.append')
+
+    for addr, opcode, modes, params, dynamic in instructions:
+        next_ip = addr + len(params) + 1
+
+        # address and value expressions for every param
+        addrs = []
+        values = []
+        for idx, (mode, param, is_dynamic) in enumerate(zip(modes, params, dynamic)):
+            cell = addr + idx + 1
+            if mode == 1:
+                addrs.append(None)
+                values.append(f'm[{cell}]' if is_dynamic else f'{param}')
+                continue
+            if not is_dynamic:
+                target = f'{param}' if mode == 0 else offset_expr('rb', param)
+            else:
+                target = f'p{idx}'
+                lines.append(f'{target} = {"rb + " if mode == 2 else ""}m[{cell}]')
+                lines.append(f'if not 0 <= {target} < len(m):')
+                lines += leave(f'vm._step({addr})', '    ')
+            addrs.append(target)
+            values.append(f'm[{target}]')
+
+        if opcode in WRITE_PARAMS:
+            if opcode == Opcode.ADD:
+                value = f'{values[0]} + {values[1]}'
+            elif opcode == Opcode.MULT:
+                value = f'{values[0]} * {values[1]}'
+            elif opcode == Opcode.LESS_THAN:
+                value = f'1 if {values[0]} < {values[1]} else 0'
+            elif opcode == Opcode.EQUALS:
+                value = f'1 if {values[0]} == {values[1]} else 0'
+
+            target = addrs[-1]
+            if ' ' in target:
+                lines.append(f'a = {target}')
+                target = 'a'
+            lines.append(f'm[{target}] = {value}')
+            # the write may have changed compiled code, stop using it
+            lines.append(f'if {target} in watched:')
+            lines.append(f'    vm._invalidate({target})')
+            lines += leave(next_ip, '    ')
+        elif opcode == Opcode.OUTPUT:
+            lines.append(f'out({values[0]})')
+        elif opcode == Opcode.SET_REL:
+            lines.append(f'rb += {values[0]}')
+        elif opcode == Opcode.JUMP_IF_TRUE:
+            lines.append(f'if {values[0]}:')
+            lines += leave(values[1], '    ')
+        elif opcode == Opcode.JUMP_IF_FALSE:
+            lines.append(f'if not {values[0]}:')
+            lines += leave(values[1], '    ')
+
+    addr, _, _, params, _ = instructions[-1]
+    lines += leave(addr + len(params) + 1)
+
+    body = '\n    '.join(lines)
+    return f'def block_{start}(vm, m):\n    {body}\n'
+
+def compile_block(start, instructions):
+    namespace = {}
+    exec(generate_block(start, instructions), namespace)
+    return namespace[f'block_{start}']
+
+def step_block(start):
+    """Block which hands the instruction at start to the interpreter."""
+    def block(vm, m):
+        return vm._step(start)
+    return block
+
+
+class CompiledIntcodeProgram(IntcodeProgram):
+    """IntcodeProgram which compiles basic blocks into Python functions.
+
+    Input, halt and anything a block cannot handle fall back to the interpreter.
+    A write into the code of a compiled block drops that block. The written cell
+    is then read from memory by the recompiled block instead of being a constant,
+    so programs which patch their own operands do not keep recompiling.
+    """
+    def __init__(self, memory, input_vals=None, **kwargs):
+        super().__init__(memory, input_vals, **kwargs)
+        if self.max_steps is not None or self.detect_cycles:
+            raise ValueError('the watchdog only runs on the interpreter')
+        # compiled blocks by start address, and the code addresses they depend on
+        self.blocks = {}
+        self.block_cells = {}
+        # map of code addresses to the start of every block depending on them
+        self.watched = {}
+        # code addresses the program has written to
+        self.volatile = set()
+
+    def update(self, addr, new_val):
+        super().update(addr, new_val)
+        if addr in self.watched:
+            self._invalidate(addr)
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self.blocks = {}
+        self.block_cells = {}
+        self.watched = {}
+
+    def fork(self):
+        program = super().fork()
+        program.blocks = dict(self.blocks)
+        program.block_cells = dict(self.block_cells)
+        program.watched = {addr: set(starts) for addr, starts in self.watched.items()}
+        program.volatile = set(self.volatile)
+        return program
+
+    def _execute(self):
+        m = self.m
+        blocks = self.blocks
+        ip = self.ip
+        while ip >= 0:
+            block = blocks.get(ip)
+            if block is None:
+                block = self._compile(ip)
+            ip = block(self, m)
+
+        self.ip = ip = -2 - ip
+        return m[ip] == Opcode.HALT.value
+
+    def _compile(self, start):
+        m = self.m
+        for cells, words, max_position, block in BLOCK_CACHE.get(start, ()):
+            if cells[-1] >= len(m) or not self.volatile.isdisjoint(cells):
+                continue
+            if [m[addr] for addr in cells] == words:
+                if max_position >= len(m):
+                    self._grow(max_position)
+                break
+        else:
+            cells, max_position, block = self._compile_new(start)
+
+        if cells:
+            self.block_cells[start] = cells
+            for addr in cells:
+                self.watched.setdefault(addr, set()).add(start)
+        self.blocks[start] = block
+        return block
+
+    def _compile_new(self, start):
+        m = self.m
+        instructions = []
+        cells = []
+        max_position = -1
+        addr = start
+        while len(instructions) < MAX_BLOCK_LEN and addr < len(m):
+            if m[addr] not in DECODE_TABLE or addr in self.volatile:
+                break
+            opcode, modes = decode(m[addr])
+            if opcode in (Opcode.INPUT, Opcode.HALT):
+                break
+            num = PARAM_LENS[opcode]
+            if addr + num >= len(m):
+                break
+            params = m[addr + 1:addr + num + 1]
+            dynamic = tuple(addr + idx + 1 in self.volatile for idx in range(num))
+
+            # fixed position mode addresses, make sure they are in memory now
+            positions = [
+                param for mode, param, is_dynamic in zip(modes, params, dynamic)
+                if mode == 0 and not is_dynamic
+            ]
+            if positions and (min(positions) < 0 or max(positions) >= self.max_memory):
+                break
+            if positions:
+                max_position = max(max_position, *positions)
+                if max_position >= len(m):
+                    self._grow(max_position)
+
+            instructions.append((addr, opcode, modes, params, dynamic))
+            cells.append(addr)
+            cells += [addr + idx + 1 for idx in range(num) if not dynamic[idx]]
+            addr += num + 1
+            if opcode in (Opcode.JUMP_IF_TRUE, Opcode.JUMP_IF_FALSE):
+                break
+            # later relative accesses cannot be resolved against an unknown base
+            if opcode == Opcode.SET_REL and (modes[0] != 1 or dynamic[0]):
+                break
+
+        if not instructions:
+            return (), -1, step_block(start)
+
+        cells = tuple(cells)
+        block = compile_block(start, instructions)
+        variants = BLOCK_CACHE.setdefault(start, [])
+        variants.append((cells, [m[addr] for addr in cells], max_position, block))
+        if len(variants) > MAX_VARIANTS:
+            del variants[0]
+        return cells, max_position, block
+
+    def _invalidate(self, addr):
+        self.volatile.add(addr)
+        for start in self.watched.pop(addr, ()):
+            del self.blocks[start]
+            for cell in self.block_cells.pop(start):
+                starts = self.watched.get(cell)
+                if starts is not None:
+                    starts.discard(start)
+                    if not starts:
+                        del self.watched[cell]
+
+    def _step(self, ip):
+        """Interpret the single instruction at ip."""
+        m = self.m
+        while True:
+            try:
+                handler = DECODE_TABLE[m[ip]]
+                target = self._write_target(ip)
+                next_ip = handler(self, m, ip)
+                break
+            except KeyError:
+                raise ValueError(f'received invalid instruction {m[ip]} at address {ip}') from None
+            except IndexError:
+                self._fault(ip)
+
+        if next_ip >= 0 and target in self.watched:
+            self._invalidate(target)
+        return next_ip
+
+    def _write_target(self, ip):
+        write = WRITE_TABLE.get(self.m[ip])
+        if write is None:
+            return None
+        idx, mode = write
+        param = self.m[ip + idx + 1]
+        if mode == 2:
+            return self.relative_base + param
+        return param
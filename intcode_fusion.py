@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+from intcode import (
+    DECODE_TABLE,
+    PARAM_LENS,
+    TEMPLATES,
+    WRITE_PARAMS,
+    IntcodeProgram,
+    Opcode,
+    address_lines,
+    decode,
+    param_expr,
+)
+
+# instruction pairs worth fusing, the first instruction never jumps so the
+# second one always follows it
+FUSE_PAIRS = {
+    Opcode.LESS_THAN: {Opcode.JUMP_IF_TRUE, Opcode.JUMP_IF_FALSE},
+    Opcode.EQUALS: {Opcode.JUMP_IF_TRUE, Opcode.JUMP_IF_FALSE},
+    Opcode.SET_REL: {
+        Opcode.ADD,
+        Opcode.MULT,
+        Opcode.LESS_THAN,
+        Opcode.EQUALS,
+        Opcode.OUTPUT,
+        Opcode.JUMP_IF_TRUE,
+        Opcode.JUMP_IF_FALSE,
+        Opcode.SET_REL,
+    },
+}
+
+
+def template_lines(opcode, modes):
+    params = [
+        param_expr(mode, idx + 1, write=WRITE_PARAMS.get(opcode) == idx)
+        for idx, mode in enumerate(modes)
+    ]
+    return address_lines(modes) + TEMPLATES[opcode].format(*params).split('\n')
+
+def make_function(name, lines):
+    body = '\n    '.join(lines)
+    namespace = {}
+    exec(f'def {name}(vm, m, ip):\n    {body}\n', namespace)
+    return namespace[name]
+
+def build_checked_handler(word):
+    """Interpreter handler which first checks it still belongs to the word at ip."""
+    opcode, modes = decode(word)
+    lines = [f'if m[ip] != {word}:', '    return vm._recode(ip)']
+    return make_function(f'checked_{word}', lines + template_lines(opcode, modes))
+
+def build_fused_handler(first, second):
+    """Handler running the instructions first and second one after the other.
+
+    Should the first instruction overwrite the second, or the second one fault,
+    the handler stops after the first and leaves the second to its own handler.
+    """
+    first_opcode, first_modes = decode(first)
+    second_opcode, second_modes = decode(second)
+    first_len = PARAM_LENS[first_opcode] + 1
+
+    lines = [
+        f'if m[ip] != {first} or m[ip + {first_len}] != {second}:',
+        '    return vm._recode(ip)',
+    ]
+    # the first instruction without its final 'return ip + n'
+    lines += template_lines(first_opcode, first_modes)[:-1]
+    lines.append(f'ip += {first_len}')
+    if first_opcode in WRITE_PARAMS:
+        lines.append(f'if m[ip] != {second}:')
+        lines.append('    return ip')
+    lines.append('try:')
+    lines += ['    ' + line for line in template_lines(second_opcode, second_modes)]
+    lines.append('except IndexError:')
+    lines.append('    return ip')
+    return make_function(f'fused_{first}_{second}', lines)
+
+CHECKED_TABLE = {word: build_checked_handler(word) for word in DECODE_TABLE}
+
+# length of the first instruction of a pair, by instruction word
+FIRST_LENS = {
+    word: PARAM_LENS[opcode] + 1
+    for word, (opcode, _) in ((word, decode(word)) for word in DECODE_TABLE)
+    if opcode in FUSE_PAIRS
+}
+
+# fused handlers shared between programs, (first word, second word) to handler
+FUSED_TABLE = {}
+
+# decoded code of recently loaded programs, by program contents
+LOADED = {}
+# number of programs kept in LOADED
+MAX_LOADED = 8
+
+def fused_handler(first, second):
+    handler = FUSED_TABLE.get((first, second))
+    if handler is None:
+        if second not in DECODE_TABLE or decode(second)[0] not in FUSE_PAIRS[decode(first)[0]]:
+            return None
+        handler = FUSED_TABLE[first, second] = build_fused_handler(first, second)
+    return handler
+
+def decode_handler(vm, m, ip):
+    """Placeholder for code not decoded yet, or overwritten since."""
+    handler = vm.code[ip] = vm._handler_at(ip)
+    return handler(vm, m, ip)
+
+
+class FusedIntcodeProgram(IntcodeProgram):
+    """Interpreter running common instruction pairs as one superinstruction.
+
+    Loading the program decodes it into a list with a handler for every address,
+    with a fused handler where a pair from FUSE_PAIRS starts. Every handler
+    checks the words it was made for are still in memory, and has its address
+    decoded again when the program overwrote them.
+    """
+    def __init__(self, memory, input_vals=None, **kwargs):
+        super().__init__(memory, input_vals, **kwargs)
+        # handlers check their words, so programs loaded from the same
+        # contents can start out with the same code
+        key = tuple(self.m)
+        code = LOADED.get(key)
+        if code is None:
+            self.code = [decode_handler] * len(self.m)
+            for ip, word in enumerate(self.m):
+                if word in CHECKED_TABLE:
+                    self.code[ip] = self._handler_at(ip)
+            LOADED[key] = code = self.code
+            if len(LOADED) > MAX_LOADED:
+                del LOADED[next(iter(LOADED))]
+        self.code = code[:]
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self.code = [decode_handler] * len(self.m)
+
+    def fork(self):
+        program = super().fork()
+        program.code = self.code[:]
+        return program
+
+    def _handler_at(self, ip):
+        m = self.m
+        word = m[ip]
+        handler = CHECKED_TABLE[word]
+        first_len = FIRST_LENS.get(word)
+        if first_len is not None and ip + first_len < len(m):
+            return fused_handler(word, m[ip + first_len]) or handler
+        return handler
+
+    def _recode(self, ip):
+        self.code[ip] = decode_handler
+        return ip
+
+    def _dispatch(self, ip, limit):
+        m = self.m
+        code = self.code
+        try:
+            if limit is None:
+                while ip >= 0:
+                    ip = code[ip](self, m, ip)
+            else:
+                # a fused pair counts as one step
+                while ip >= 0 and limit:
+                    ip = code[ip](self, m, ip)
+                    limit -= 1
+                if ip < 0:
+                    limit += 1
+        finally:
+            self.ip = ip
+            self.remaining = limit
+
+    def _grow(self, addr):
+        super()._grow(addr)
+        self.code.extend([decode_handler] * (len(self.m) - len(self.code)))
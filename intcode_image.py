@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from intcode_cache import replace_file
+
+# magic, version, header size, flags, hash of the cells, number of cells, and
+# the size and modification time of the text the image was built from
+HEADER = struct.Struct('<4sHHI16sQQq')
+MAGIC = b'INTC'
+VERSION = 1
+# cells start here, a multiple of 8 so the mmap can be viewed as int64 as is
+HEADER_SIZE = 64
+# flags
+LITTLE_ENDIAN = 1
+SUFFIX = '.icb'
+
+Header = namedtuple('Header', 'version flags digest cells source_size source_mtime')
+
+
+def parse_program(text):
+    return [int(v) for v in text.strip().split(',')]
+
+def image_path(source):
+    """Path of the binary image of a program's text file, 09.txt becomes 09.icb."""
+    return os.path.splitext(source)[0] + SUFFIX
+
+def read_header(data):
+    if len(data) < HEADER.size:
+        raise ValueError('not an Intcode image')
+    magic, version, header_size, flags, digest, cells, source_size, source_mtime = HEADER.unpack_from(data)
+    if magic != MAGIC or header_size != HEADER_SIZE:
+        raise ValueError('not an Intcode image')
+    return Header(version, flags, digest, cells, source_size, source_mtime)
+
+def build_image(source, path=None):
+    """Parse a program's text file into a binary image, returns the path it was written to.
+
+    Raises OverflowError for programs with cells that do not fit into 64 bits.
+    """
+    path = path or image_path(source)
+    stat = os.stat(source)
+    with open(source, 'r') as file:
+        cells = array('q', parse_program(file.readline()))
+    if sys.byteorder != 'little':
+        cells.byteswap()
+    data = cells.tobytes()
+    header = HEADER.pack(
+        MAGIC, VERSION, HEADER_SIZE, LITTLE_ENDIAN,
+        hashlib.blake2b(data, digest_size=16).digest(),
+        len(cells), stat.st_size, stat.st_mtime_ns,
+    )
+    replace_file(path, header.ljust(HEADER_SIZE, b'\0'), data)
+    return path
+
+def map_image(path):
+    """Cells of a binary image as an int64 memoryview of the mapped file.
+
+    Raises ValueError unless the file is a complete image of this version
+    whose cells match the digest in its header.
+    """
+    with open(path, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    header = read_header(data)
+    if header.version != VERSION:
+        raise ValueError(f'Intcode image version {header.version}, expected {VERSION}')
+    end = HEADER_SIZE + 8 * header.cells
+    if len(data) != end:
+        raise ValueError(f'Intcode image {path} has {len(data)} bytes, its header says {end}')
+    cells = memoryview(data)[HEADER_SIZE:end]
+    if hashlib.blake2b(cells, digest_size=16).digest() != header.digest:
+        raise ValueError(f'cells of Intcode image {path} do not match its digest')
+    cells = cells.cast('q')
+    if sys.byteorder != 'little':
+        # the one case which has to copy
+        swapped = array('q', cells)
+        swapped.byteswap()
+        return memoryview(swapped)
+    return cells
+
+def is_current(path, source):
+    """Whether the image at path was built from source as it is now."""
+    try:
+        with open(path, 'rb') as file:
+            header = read_header(file.read(HEADER.size))
+    except (OSError, ValueError):
+        return False
+    stat = os.stat(source)
+    return (header.source_size, header.source_mtime) == (stat.st_size, stat.st_mtime_ns)
+
+def load_program(source):
+    """Memory of the program in the text file source.
+
+    The text is parsed once into a binary image beside it, later loads map
+    that image without parsing or copying. The cells come as a read-only
+    memoryview, Intcode programs copy it into their own memory. An image
+    which is stale, or fails the checks of map_image, is built again. A
+    program which does not fit into 64-bit cells, or a directory that cannot
+    be written to, gets the parsed list instead.
+    """
+    path = image_path(source)
+    if is_current(path, source):
+        try:
+            return map_image(path)
+        except ValueError:
+            pass
+    try:
+        build_image(source, path)
+    except (OverflowError, OSError):
+        with open(source, 'r') as file:
+            return parse_program(file.readline())
+    return map_image(path)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+from collections import deque
+from multiprocessing.sharedctypes import RawArray
+
+
+class Fanout:
+    """Output channel copying every value to several destinations."""
+    def __init__(self, targets):
+        self.targets = targets
+
+    def append(self, value):
+        for target in self.targets:
+            target.append(value)
+
+
+class ProgramGraph:
+    """Intcode programs wired together by channels in any directed graph.
+
+    A program's outputs go straight into the input queues of the programs it is
+    connected to. run() only resumes a program once there is input waiting for
+    it, so no time is spent on runs that stop right away.
+    """
+    def __init__(self):
+        self.programs = {}
+        # map of program name to the names of the programs it sends to
+        self.links = {}
+        # map of program name to the lists recording its outputs
+        self.taps = {}
+        self.halted = set()
+        self.blocked = set()
+
+    def add(self, name, program):
+        self.programs[name] = program
+        self.links[name] = []
+        self.taps[name] = []
+
+    def connect(self, src, dst):
+        self.links[src].append(dst)
+
+    def tap(self, src):
+        """Return a list which receives everything src outputs from now on."""
+        outputs = []
+        self.taps[src].append(outputs)
+        return outputs
+
+    def send(self, dst, values):
+        self.programs[dst].add_inputs(values)
+
+    def run(self):
+        """Run until every program has halted or waits on an empty channel."""
+        for name, program in self.programs.items():
+            targets = [self.programs[dst].inputs for dst in self.links[name]] + self.taps[name]
+            program.outputs = targets[0] if len(targets) == 1 else Fanout(targets)
+
+        ready = deque(
+            name for name, program in self.programs.items()
+            if name not in self.halted and (name not in self.blocked or program.inputs)
+        )
+        queued = set(ready)
+        while ready:
+            name = ready.popleft()
+            queued.discard(name)
+            if self.programs[name]._execute():
+                self.halted.add(name)
+            else:
+                self.blocked.add(name)
+
+            # wake up the programs that have input now
+            for dst in self.links[name]:
+                if dst not in queued and dst not in self.halted and self.programs[dst].inputs:
+                    ready.append(dst)
+                    queued.add(dst)
+
+        return len(self.halted) == len(self.programs)
+
+
+class RingBuffer:
+    """Fixed size queue of int records in shared memory, one writer and one reader process.
+
+    The first two cells count the records written and read so far. Each side
+    only ever moves its own counter, after it is done with the record cells, so
+    no lock is needed.
+    """
+    def __init__(self, capacity, record_size):
+        self.capacity = capacity
+        self.record_size = record_size
+        self.cells = RawArray('q', 2 + capacity * record_size)
+
+    def push(self, record):
+        """Append a record, returns False if the buffer is full."""
+        cells = self.cells
+        written = cells[0]
+        if written - cells[1] >= self.capacity:
+            return False
+        start = 2 + written % self.capacity * self.record_size
+        cells[start:start + self.record_size] = record
+        cells[0] = written + 1
+        return True
+
+    def pop_all(self):
+        """Remove and return every record written so far."""
+        cells = self.cells
+        read, written = cells[1], cells[0]
+        records = []
+        for pos in range(read, written):
+            start = 2 + pos % self.capacity * self.record_size
+            records.append(tuple(cells[start:start + self.record_size]))
+        cells[1] = written
+        return records
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+from multiprocessing import Pool, cpu_count
+
+# state of the pool this worker process belongs to, see worker_pool
+STATE = None
+
+
+def _init_worker(*state):
+    global STATE
+    STATE = state
+
+def worker_pool(state, processes=None):
+    """Process pool whose workers each get state once, instead of with every task.
+
+    Tasks read it back with worker_state(). state has to pickle where the
+    platform starts workers by spawning them.
+    """
+    return Pool(processes or cpu_count(), initializer=_init_worker, initargs=tuple(state))
+
+def worker_state():
+    return STATE
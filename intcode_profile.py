@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+from collections import Counter
+
+from intcode import DECODE_TABLE, IntcodeProgram, decode
+
+# characters of the heatmap, from cold to hot
+SHADES = ' .:-=+*#%@'
+
+
+class Profile:
+    """Execution counts of one or more ProfilingIntcodePrograms."""
+    def __init__(self):
+        # map of (address, instruction word) to the times it executed
+        self.counts = {}
+        # map of address to the times a run stopped there waiting for input
+        self.stalls = Counter()
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def opcode_counts(self):
+        counts = Counter()
+        for (_, word), count in self.counts.items():
+            counts[decode(word)[0]] += count
+        return counts
+
+    def mode_counts(self):
+        """Counts by (opcode, modes)."""
+        counts = Counter()
+        for (_, word), count in self.counts.items():
+            counts[decode(word)] += count
+        return counts
+
+    def address_counts(self):
+        counts = Counter()
+        for (addr, _), count in self.counts.items():
+            counts[addr] += count
+        return counts
+
+    def flat_profile(self, top=None):
+        """Text table of instruction counts by opcode and modes, hottest first."""
+        total = self.total() or 1
+        lines = [f'{"count":>12} {"%":>6}  instruction']
+        for (opcode, modes), count in self.mode_counts().most_common(top):
+            modes = ''.join(str(mode) for mode in modes)
+            lines.append(f'{count:12,} {100 * count / total:6.2f}  {opcode.name} {modes}')
+        lines.append(f'{self.total():12,} instructions, {sum(self.stalls.values()):,} input stalls')
+        for addr, count in self.stalls.most_common(top):
+            lines.append(f'{count:12,} stalls at {addr}')
+        return '\n'.join(lines)
+
+    def hot_addresses(self, top=10):
+        return self.address_counts().most_common(top)
+
+    def heatmap(self, width=64):
+        """Text map of executed addresses, width addresses per row, hotter is darker."""
+        counts = self.address_counts()
+        if not counts:
+            return ''
+        hottest = max(counts.values())
+        lines = []
+        for start in range(0, max(counts) + 1, width):
+            addrs = range(start, start + width)
+            if not any(addr in counts for addr in addrs):
+                continue
+            # any executed address gets at least the lightest shade
+            shades = [
+                1 + (counts[addr] - 1) * (len(SHADES) - 1) // hottest if counts[addr] else 0
+                for addr in addrs
+            ]
+            lines.append(f'{start:6} |{"".join(SHADES[shade] for shade in shades)}|')
+        return '\n'.join(lines)
+
+
+class ProfilingIntcodeProgram(IntcodeProgram):
+    """Interpreter recording what it executes into a Profile.
+
+    A separate run loop, so plain IntcodeProgram pays nothing for it. Programs
+    can share a profile, forks keep adding to the one they were forked from.
+    """
+    def __init__(self, memory, input_vals=None, profile=None, **kwargs):
+        super().__init__(memory, input_vals, **kwargs)
+        self.profile = profile if profile is not None else Profile()
+
+    def _dispatch(self, ip, limit):
+        m = self.m
+        table = DECODE_TABLE
+        counts = self.profile.counts
+        try:
+            while ip >= 0 and limit != 0:
+                word = m[ip]
+                next_ip = table[word](self, m, ip)
+                if next_ip < 0:
+                    ip = next_ip
+                    break
+                key = (ip, word)
+                counts[key] = counts.get(key, 0) + 1
+                ip = next_ip
+                if limit is not None:
+                    limit -= 1
+        finally:
+            self.ip = ip
+            self.remaining = limit
+
+    def _execute(self):
+        complete = super()._execute()
+        if not complete:
+            self.profile.stalls[self.ip] += 1
+        return complete
+
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+import time
+from bisect import bisect_right
+from functools import partial
+
+from intcode import DECODE_TABLE, WRITE_PARAMS, IntcodeProgram, Opcode, Snapshot, decode
+from intcode_cache import read_varint, write_varint
+
+MAGIC = b'ICT1'
+# Record kinds. Every record is its kind, the steps since the previous record
+# and then its values: a checkpoint its absolute step and a snapshot, an input
+# or output its value, a write its address and value. A run ends with a halt
+# or a blocked record, at the step it stopped on.
+CHECKPOINT, INPUT, OUTPUT, WRITE, HALT, BLOCKED = range(6)
+VALUE_COUNTS = {INPUT: 1, OUTPUT: 1, WRITE: 2, HALT: 0, BLOCKED: 0}
+# instructions between checkpoints, replay runs at most this many to seek
+CHECKPOINT_INTERVAL = 100_000
+# bytes buffered before they go to the file
+FLUSH_SIZE = 1 << 16
+
+
+def build_trace_params(record_writes):
+    """Map instruction words which leave records to (kind, offset, mode, write) of the parameter they log.
+
+    kind is the record of the value, write whether the address and value go
+    in as a write record too. Inputs are stores, so with record_writes they
+    get both.
+    """
+    params = {}
+    for word in DECODE_TABLE:
+        opcode, modes = decode(word)
+        if opcode == Opcode.INPUT:
+            kind = INPUT
+        elif opcode == Opcode.OUTPUT:
+            kind = OUTPUT
+        elif record_writes and opcode in WRITE_PARAMS:
+            kind = WRITE
+        else:
+            continue
+        idx = WRITE_PARAMS.get(opcode, 0)
+        write = record_writes and opcode in WRITE_PARAMS
+        params[word] = (kind, idx + 1, modes[idx], write)
+    return params
+
+IO_PARAMS = build_trace_params(False)
+WRITE_TRACE_PARAMS = build_trace_params(True)
+
+
+class TraceWriter:
+    """Append-only binary log of one program's run, see TracingIntcodeProgram."""
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.buffer = bytearray(MAGIC)
+        # step of the last record, the next one stores the difference
+        self.step = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, kind, step, *values):
+        buffer = self.buffer
+        buffer.append(kind)
+        write_varint(buffer, step - self.step)
+        self.step = step
+        for value in values:
+            write_varint(buffer, value)
+        if len(buffer) >= FLUSH_SIZE:
+            self.flush()
+
+    def checkpoint(self, step, snapshot):
+        buffer = self.buffer
+        buffer.append(CHECKPOINT)
+        write_varint(buffer, step - self.step)
+        self.step = step
+        for value in (step, snapshot.ip, snapshot.relative_base, len(snapshot.inputs)):
+            write_varint(buffer, value)
+        for value in snapshot.inputs:
+            write_varint(buffer, value)
+        write_varint(buffer, len(snapshot.memory))
+        for value in snapshot.memory:
+            write_varint(buffer, value)
+        self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class TracingIntcodeProgram(IntcodeProgram):
+    """Interpreter logging its run to a TraceWriter.
+
+    Every input taken and output made is recorded with the step, the number
+    of instructions executed before it, and with record_writes so is every
+    memory write. Every checkpoint_interval steps the whole state goes in as
+    well, so a Trace can get to any step without running from the start. Its
+    own _dispatch loop, like ProfilingIntcodeProgram's.
+    """
+    def __init__(self, memory, input_vals=None, trace=None, record_writes=False,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, **kwargs):
+        super().__init__(memory, input_vals, **kwargs)
+        self.trace = trace
+        self.params = WRITE_TRACE_PARAMS if record_writes else IO_PARAMS
+        self.checkpoint_interval = checkpoint_interval
+        self.steps = 0
+        self.next_checkpoint = 0
+
+    def _dispatch(self, ip, limit):
+        m = self.m
+        table = DECODE_TABLE
+        params = self.params
+        trace = self.trace
+        steps = self.steps
+        try:
+            while ip >= 0 and limit != 0:
+                if steps >= self.next_checkpoint:
+                    self.ip = ip
+                    trace.checkpoint(steps, self.snapshot())
+                    self.next_checkpoint = steps + self.checkpoint_interval
+                word = m[ip]
+                param = params.get(word)
+                if param is None:
+                    ip = table[word](self, m, ip)
+                else:
+                    kind, offset, mode, write = param
+                    # where the instruction reads or writes its value,
+                    # none of these change the relative base
+                    if mode == 0:
+                        addr = m[ip + offset]
+                    elif mode == 1:
+                        addr = ip + offset
+                    else:
+                        addr = self.relative_base + m[ip + offset]
+                    next_ip = table[word](self, m, ip)
+                    if next_ip >= 0:
+                        value = m[addr]
+                        if kind != WRITE:
+                            trace.record(kind, steps, value)
+                        if write:
+                            trace.record(WRITE, steps, addr, value)
+                    ip = next_ip
+                if ip < 0:
+                    break
+                steps += 1
+                if limit is not None:
+                    limit -= 1
+        finally:
+            self.ip = ip
+            self.remaining = limit
+            self.steps = steps
+
+    def _execute(self):
+        complete = super()._execute()
+        self.trace.record(HALT if complete else BLOCKED, self.steps)
+        return complete
+
+
+def execute_steps(program, count):
+    """Execute exactly count instructions of program."""
+    m = program.m
+    table = DECODE_TABLE
+    ip = program.ip
+    while count:
+        try:
+            while count:
+                ip = table[m[ip]](program, m, ip)
+                if ip < 0:
+                    raise ValueError(f'program stopped at address {-2 - ip} with {count} steps to go')
+                count -= 1
+        except IndexError:
+            program._fault(ip)
+    program.ip = ip
+
+
+class Trace:
+    """A run recorded by TracingIntcodeProgram, read back without running it again.
+
+    Opening the trace indexes its checkpoints and inputs by step. seek() then
+    finds the last checkpoint up to a step by binary search and runs forward
+    from there, which is at most one checkpoint interval of instructions.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = file.read()
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not an Intcode trace')
+        self.checkpoint_steps = []
+        self.checkpoint_offsets = []
+        self.input_steps = []
+        self.input_values = []
+        self.halted = False
+        self.steps = 0
+        for offset, kind, step, values in self.records():
+            if kind == CHECKPOINT:
+                self.checkpoint_steps.append(step)
+                self.checkpoint_offsets.append(offset)
+            elif kind == INPUT:
+                self.input_steps.append(step)
+                self.input_values.append(values[0])
+            elif kind == HALT:
+                self.halted = True
+            self.steps = step
+
+    def records(self, offset=len(MAGIC)):
+        """(offset, kind, step, values) of every record from offset on, which must start one."""
+        data = self.data
+        pos = offset
+        step = None
+        while pos < len(data):
+            offset = pos
+            kind = data[pos]
+            delta, pos = read_varint(data, pos + 1)
+            if kind == CHECKPOINT:
+                step, pos = read_varint(data, pos)
+                values, pos = self._read_snapshot(pos)
+            else:
+                if step is None:
+                    raise ValueError(f'trace records at {offset} do not follow a checkpoint')
+                step += delta
+                values = []
+                for _ in range(VALUE_COUNTS[kind]):
+                    value, pos = read_varint(data, pos)
+                    values.append(value)
+            yield offset, kind, step, values
+
+    def _read_snapshot(self, pos):
+        data = self.data
+        ip, pos = read_varint(data, pos)
+        relative_base, pos = read_varint(data, pos)
+        fields = []
+        for _ in range(2):
+            count, pos = read_varint(data, pos)
+            values = []
+            for _ in range(count):
+                value, pos = read_varint(data, pos)
+                values.append(value)
+            fields.append(tuple(values))
+        inputs, memory = fields
+        return Snapshot(memory, ip, relative_base, inputs), pos
+
+    def inputs(self):
+        return list(self.input_values)
+
+    def outputs(self):
+        return [values[0] for _, kind, _, values in self.records() if kind == OUTPUT]
+
+    def writes(self):
+        """(step, address, value) of every memory write, if they were recorded."""
+        return [(step, *values) for _, kind, step, values in self.records() if kind == WRITE]
+
+    def seek(self, step, program_cls=IntcodeProgram):
+        """Program in the state the recorded run was in before executing instruction number step.
+
+        Its inputs are the ones the recorded run took from then on, so running
+        it goes on the same way.
+        """
+        if not 0 <= step <= self.steps:
+            raise ValueError(f'step {step} is outside the trace of {self.steps} steps')
+        idx = bisect_right(self.checkpoint_steps, step) - 1
+        _, _, start, snapshot = next(self.records(self.checkpoint_offsets[idx]))
+        program = program_cls.from_snapshot(snapshot)
+        program.inputs.clear()
+        program.add_inputs(self.input_values[bisect_right(self.input_steps, start - 1):])
+        execute_steps(program, step - start)
+        program.outputs = []
+        return program
+
+
+def record(workload, memory, path, record_writes=False):
+    """Run a workload of a single program traced to path, returns the seconds it took."""
+    with TraceWriter(path) as trace:
+        start = time.perf_counter()
+        workload(partial(TracingIntcodeProgram, trace=trace, record_writes=record_writes), memory)
+        return time.perf_counter() - start
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+import pytest
+
+from intcode import IntcodeProgram
+from intcode_compiler import CompiledIntcodeProgram
+from intcode_fusion import FusedIntcodeProgram
+from intcode_image import load_program
+
+TIERS = [IntcodeProgram, FusedIntcodeProgram, CompiledIntcodeProgram]
+
+# programs which rewrite their own code, with their inputs and the outputs
+# of running them as written
+SELF_MODIFYING = {
+    # turns the ADD at 4 into a MULT before it runs
+    'opcode': ([1101, 0, 2, 4, 1, 12, 13, 14, 4, 14, 99, 0, 6, 7, 0], [], [42]),
+    # counts to 5 by incrementing the operand of its output in a loop
+    'operand': (
+        [104, 0, 1001, 1, 1, 1, 1007, 1, 5, 20, 1005, 20, 0, 99] + [0] * 7,
+        [], [0, 1, 2, 3, 4],
+    ),
+    # the compare of a compare and jump pair turns the jump into an ADD
+    'fused pair': ([1107, 1, 2, 4, 1105, 1, 12, 16, 4, 16, 99, 0, 104, 7, 99, 0, 0], [], [105]),
+    # a relative mode write turns the ADD at 8 into a MULT
+    'relative': (
+        [109, 10, 21101, 1100, 2, -2, 109, 0, 1101, 7, 6, 20, 4, 20, 99] + [0] * 6,
+        [], [42],
+    ),
+    # stores its input over the operand of the output which follows
+    'input': ([3, 3, 104, 0, 99], [17], [17]),
+}
+
+# days whose programs all tiers run, with the inputs to run them on
+DAYS = [('05', [1]), ('05', [5]), ('09', [1]), ('09', [2])]
+
+
+def outputs(program_cls, memory, inputs):
+    return program_cls(memory, inputs).run()
+
+
+@pytest.mark.parametrize('name', SELF_MODIFYING)
+@pytest.mark.parametrize('program_cls', TIERS[1:])
+def test_self_modifying(program_cls, name):
+    memory, inputs, expected = SELF_MODIFYING[name]
+    assert outputs(IntcodeProgram, memory, inputs) == (expected, True)
+    assert outputs(program_cls, memory, inputs) == (expected, True)
+
+@pytest.mark.parametrize('day, inputs', DAYS)
+@pytest.mark.parametrize('program_cls', TIERS[1:])
+def test_days(program_cls, day, inputs):
+    memory = load_program(f'{day}.txt')
+    assert outputs(program_cls, memory, inputs) == outputs(IntcodeProgram, memory, inputs)
+
+@pytest.mark.parametrize('program_cls', TIERS[1:])
+def test_day_02(program_cls):
+    # day 2 stores its results over its own code
+    memory = load_program('02.txt')
+    expected = IntcodeProgram(memory)
+    program = program_cls(memory)
+    for vm in (expected, program):
+        vm.update(1, 12)
+        vm.update(2, 2)
+        vm.run()
+    assert program.m[:len(memory)] == expected.m[:len(memory)]
+
+@pytest.mark.parametrize('program_cls', TIERS[1:])
+def test_rerun_after_patch(program_cls):
+    # patching code between runs drops what was compiled or fused for it
+    memory, inputs, _ = SELF_MODIFYING['operand']
+    program = program_cls(memory, inputs)
+    program.run()
+    program.restore(IntcodeProgram(memory).snapshot())
+    program.update(1, 10)
+    program.update(8, 13)
+    assert program.run() == ([10, 11, 12], True)